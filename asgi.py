@@ -0,0 +1,10 @@
+"""
+Optional ASGI sidecar with WebSocket autosave channel, see `backend.core.autosave`.
+
+    uvicorn asgi:application --port 8001
+"""
+from server import create_app, get_application
+from backend.core.autosave import AutosaveApp
+
+create_app()
+application = AutosaveApp(get_application())
@@ -6,7 +6,7 @@ from passlib.hash import argon2
 
 from backend.core.enums import TokenType
 from backend.core.models import Users
-from backend.core.schema import TokensSchema, LoginSchema
+from backend.core.schema import TokensSchema, LoginSchema, get_schema
 from backend.helpers import success_response, fail_response
 
 from server import application
@@ -65,10 +65,10 @@ class UserLogin(Resource):
             ORM.add_token(token=access_token, token_type=TokenType.ACCESS, user_id=user_auth.id)
             ORM.add_token(token=refresh_token, token_type=TokenType.REFRESH, user_id=user_auth.id)
 
-            return TokensSchema().dump({
+            return get_schema(TokensSchema).dump({
                 'access_token': access_token,
                 'refresh_token': refresh_token,
-            })
+            }).data
         except Exception as expt:
             print(f"Auth error: {expt}")
 
@@ -118,6 +118,6 @@ class TokenRefresh(Resource):
         access_token = create_access_token(identity=identity)
         ORM.add_token(token=access_token, token_type=TokenType.ACCESS, user_id=user.id)
 
-        return TokensSchema().dump({
+        return get_schema(TokensSchema).dump({
             'access_token': access_token
-        })
+        }).data
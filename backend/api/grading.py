@@ -0,0 +1,108 @@
+from flask_jwt_extended import jwt_required, get_current_user
+from flask_restful import Resource
+from marshmallow import fields
+from webargs.flaskparser import use_kwargs, use_args
+
+from backend.core.decorators import university_staff_only
+from backend.core.models import Users
+from backend.core.schema import GradesSubmitSchema
+from backend.helpers import json_response, fail_response, success_response
+from server import application
+
+
+class GradingNext(Resource):
+    @jwt_required
+    @university_staff_only
+    @use_kwargs({"count": fields.Int(location="query", missing=1),
+                 "test_id": fields.Int(location="query", missing=None)})
+    def post(self, count, test_id):
+        """
+        ---
+        summary: Claim answers for manual grading
+        description:
+            Reserves the next ungraded answers of completed submissions for the current grader.
+            Claimed answers are not offered to other graders until they are graded or the lease
+            (`claimed_until`, UTC) expires. Graders never wait for each other
+        parameters:
+            - in: query
+              name: count
+              schema:
+                type: integer
+              required: false
+              description: Number of answers to claim, 1 by default, at most 50
+            - in: query
+              name: test_id
+              schema:
+                type: integer
+              required: false
+              description: Claim answers of this test only
+        responses:
+            200:
+                description: OK, empty list when there is nothing to grade
+                content:
+                    application/json:
+                        example: [
+                            {
+                                "submission_id": 17,
+                                "question_id": 5,
+                                "question": "Describe your motivation",
+                                "points": 10,
+                                "answer": ["..."],
+                                "claimed_until": "2019-04-20T12:35:00"
+                            }
+                        ]
+        """
+        user: Users = get_current_user()
+        config = application.app.config
+        count = min(max(count, 1), config['GRADING_MAX_CLAIM'])
+
+        claimed = application.orm.claim_answers(user.id, count, config['GRADING_LEASE'], test_id=test_id)
+        if claimed is None:
+            return fail_response("Answers were not claimed", code=500)
+
+        return json_response([{'submission_id': row.submission_id, 'question_id': row.question_id,
+                               'question': row.question, 'points': row.points, 'answer': row.answer,
+                               'claimed_until': row.claimed_until} for row in claimed])
+
+
+class GradingSubmit(Resource):
+    @jwt_required
+    @university_staff_only
+    @use_args(GradesSubmitSchema(), locations=("json",))
+    def post(self, args):
+        """
+        ---
+        summary: Submit manual grades
+        description:
+            Saves grades of answers claimed by the current grader in one transaction and releases them.
+            Grades of answers that were claimed by another grader after the lease expired
+            or that exceed the question points are rejected
+        requestBody:
+            required: true
+            content:
+                application/json:
+                  schema: GradesSubmitSchema
+        responses:
+            201:
+                description: OK
+                content:
+                    application/json:
+                        example: {
+                            "status": "success",
+                            "message": ["Grades saved"],
+                            "data": {"saved": 2, "rejected": [{"submission_id": 18, "question_id": 5}]}
+                        }
+        """
+        user: Users = get_current_user()
+
+        # the last grade of the same answer wins
+        grades = {(grade['submission_id'], grade['question_id']): grade for grade in args['grades']}
+
+        saved = application.orm.submit_claimed_grades(user.id, list(grades.values()))
+        if saved is None:
+            return fail_response("Grades were not saved", code=500)
+
+        rejected = [{'submission_id': submission_id, 'question_id': question_id}
+                    for submission_id, question_id in grades.keys() - set(saved)]
+
+        return success_response(msg="Grades saved", code=201, saved=len(saved), rejected=rejected)
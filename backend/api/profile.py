@@ -1,19 +1,30 @@
-from flask.json import jsonify
+from flask import request
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_current_user
 from flask_restful import Resource
+from marshmallow import fields
 from passlib.hash import argon2
 from validate_email import validate_email
-from webargs.flaskparser import use_args
+from webargs.flaskparser import use_args, use_kwargs
 
-from backend.core.decorators import university_staff_only
+from backend.core.decorators import university_staff_only, manager_role_required
+from backend.core.importer import ImportFileError, import_candidates
 from backend.core.models import Users
 from backend.core.schema import RegistrationSchema, UsersSchema, CandidatesDocumentsSchema, CandidatesInfoSchema, \
-    CandidatesStatusSchema
-from backend.helpers import success_response, fail_response, generic_response
+    CandidatesStatusSchema, dump, dump_fields, field_attributes
+from backend.helpers import json_response, success_response, fail_response, generic_response, not_modified_response, \
+    profile_etag, requested_fields
 from server import application
 
 USERS_PER_PAGE = 5
 
+# sections of the profile in response order: schema and ORM method loading the section by user id
+PROFILE_SECTIONS = {
+    'user': (UsersSchema, None),
+    'document': (CandidatesDocumentsSchema, lambda u_id: application.orm.get_document(u_id)),
+    'status': (CandidatesStatusSchema, lambda u_id: application.orm.get_status(u_id)),
+    'info': (CandidatesInfoSchema, lambda u_id: application.orm.get_info(u_id)),
+}
+
 
 class UserRegistration(Resource):
     @use_args(RegistrationSchema)
@@ -66,6 +77,70 @@ class UserRegistration(Resource):
         return generic_response(201)
 
 
+class CandidatesImport(Resource):
+    @jwt_required
+    @manager_role_required
+    @use_kwargs({"import_format": fields.Str(location="query", load_from="format", missing=None)})
+    def post(self, import_format):
+        """
+        ---
+        summary: Candidates bulk import
+        description:
+            Registers candidates from CSV with header or from newline delimited JSON objects, sent as the request body
+            or as `file` form field. Columns are `email`, `password` (required), `first_name`, `last_name`,
+            `nationality`, `gender` (male/female), `date_of_birth` (YYYY-MM-DD), `subscription_email`, `skype`,
+            `phone`. Invalid rows and already registered emails are reported and skipped, the rest is created
+        parameters:
+            - in: query
+              name: format
+              schema:
+                type: string
+                enum: [csv, ndjson]
+              required: false
+              description: Input format, by default taken from the file extension or `csv`
+        requestBody:
+            required: true
+            content:
+                text/csv:
+                    example: |
+                        email,password,first_name,last_name,gender,date_of_birth
+                        ivan@example.com,secret,Ivan,Ivanov,male,1999-01-31
+        responses:
+            201:
+                description: OK
+                content:
+                    application/json:
+                        example: {
+                            "status": "success",
+                            "message": ["Candidates imported"],
+                            "data": {"created": 998, "errors": [
+                                {"row": 3, "email": "ivan@", "message": "Invalid email"},
+                                {"row": 7, "email": "anna@example.com", "message": "User with such email already exists"}
+                            ]}
+                        }
+            400:
+                description: The file can not be read
+                content:
+                    application/json:
+                        schema: ErrorSchema
+        """
+        upload = request.files.get('file')
+        data = upload.read() if upload is not None else request.get_data()
+        if import_format is None:
+            filename = upload.filename if upload is not None else ''
+            import_format = 'ndjson' if filename.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+        try:
+            result = import_candidates(application, data, import_format)
+        except (ImportFileError, UnicodeDecodeError) as excpt:
+            return fail_response(str(excpt), code=400)
+
+        if result is None:
+            return fail_response("Candidates were not imported", code=500)
+
+        return success_response(msg="Candidates imported", code=201, _data=result)
+
+
 class UserProfile(Resource):
     @jwt_required
     @university_staff_only
@@ -74,6 +149,13 @@ class UserProfile(Resource):
         ---
         summary: Profile info
         description: All information about some user's profile
+        parameters:
+          - in: query
+            name: fields
+            schema:
+              type: string
+            required: false
+            description: Comma separated list of profile sections to return, e.g. `user,status`
         responses:
           200:
             description: OK
@@ -82,8 +164,20 @@ class UserProfile(Resource):
                 schema: ProfileInfoSchema
                 example:
                     $ref: '#/components/examples/ProfileFull'
+          304:
+            description: Not modified, profile version matches `If-None-Match` header
         """
-        return ProfileRetreiver.get_profile(u_id)
+        fields = requested_fields(list(PROFILE_SECTIONS))
+
+        version = application.orm.get_user_version(u_id)
+        if version is None:
+            return fail_response(msg="user not found", code=404)
+
+        not_modified = not_modified_response(profile_etag(u_id, version))
+        if not_modified is not None:
+            return not_modified
+
+        return ProfileRetreiver.get_profile(u_id, fields)
 
     @jwt_required
     def put(self):
@@ -102,6 +196,13 @@ class CurrentUserProfile(Resource):
         ---
         summary: Current profile info
         description: All information about current user's profile
+        parameters:
+          - in: query
+            name: fields
+            schema:
+              type: string
+            required: false
+            description: Comma separated list of profile sections to return, e.g. `user,status`
         responses:
           200:
             description: OK
@@ -110,34 +211,40 @@ class CurrentUserProfile(Resource):
                 schema: ProfileInfoSchema
                 example:
                     $ref: '#/components/examples/ProfileFull'
+          304:
+            description: Not modified, profile version matches `If-None-Match` header
         """
+        fields = requested_fields(list(PROFILE_SECTIONS))
         user: Users = get_current_user()
 
-        return ProfileRetreiver.get_profile(user.id)
+        # user is already loaded by JWT callback, so this check costs no queries
+        not_modified = not_modified_response(profile_etag(user.id, user.version))
+        if not_modified is not None:
+            return not_modified
+
+        return ProfileRetreiver.get_profile(user.id, fields)
 
 
 class ProfileRetreiver(object):
 
     @staticmethod
-    def get_profile(u_id):
+    def get_profile(u_id, fields: [str] = None):
+        """
+        :param fields: profile sections to return, all of them if None. Sections that are not requested are not queried
+        """
         user = application.orm.get_user(u_id)
         if user is None:
             return fail_response(msg="user not found", code=404)
-        documents = application.orm.get_document(u_id)
-        info = application.orm.get_info(u_id)
-        status = application.orm.get_status(u_id)
-        user_schema = UsersSchema()
-        docs_schema = CandidatesDocumentsSchema()
-        info_schema = CandidatesInfoSchema()
-        status_schema = CandidatesStatusSchema()
 
         profile = dict()
-        profile.update({'user': user_schema.dump(user).data})
-        profile.update({'document': docs_schema.dump(documents).data})
-        profile.update({'status': info_schema.dump(status).data})
-        profile.update({'info': status_schema.dump(info).data})
+        for section in fields or PROFILE_SECTIONS:
+            schema_class, load = PROFILE_SECTIONS[section]
+            profile[section] = dump(schema_class, user if section == 'user' else load(u_id))
+
+        response = json_response(profile)
+        response.set_etag(profile_etag(user.id, user.version))
 
-        return jsonify(profile)
+        return response
 
 
 class UsersList(Resource):
@@ -148,6 +255,13 @@ class UsersList(Resource):
         ---
         summary: Users list
         description: List of all users with pagination, filtering and sorting
+        parameters:
+          - in: query
+            name: fields
+            schema:
+              type: string
+            required: false
+            description: Comma separated list of fields to return, e.g. `id,first_name,last_name`
         responses:
           200:
             description: OK
@@ -160,10 +274,10 @@ class UsersList(Resource):
                     - $ref: '#/components/examples/ProfileFull'
         """
         current_user = get_jwt_identity()
-        users = application.orm.get_users(page_num=page, num_of_users=USERS_PER_PAGE)
+        fields = requested_fields(dump_fields(UsersSchema))
+        columns = field_attributes(UsersSchema, fields) if fields is not None else None
+
+        users = application.orm.get_users(page_num=page, num_of_users=USERS_PER_PAGE, columns=columns)
         if users is None:
             return fail_response("Some problems with users retrieving", code=404)
-        user_schema = UsersSchema(many=True)
-        res = user_schema.dump(users)
-
-        return jsonify(res.data)
+        return json_response(dump(UsersSchema, users, many=True, only=fields))
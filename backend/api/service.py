@@ -1,9 +1,13 @@
 import socket
 
+from flask import Response, send_from_directory
+from flask_jwt_extended import jwt_required
 from flask_restful import Resource
 
-from backend.core.schema import HostSchema
-from backend.helpers import success_response
+from backend.core.decorators import manager_role_required
+from backend.core.schema import HostSchema, get_schema
+from backend.helpers import success_response, fail_response
+from server import application
 
 
 class ServiceStatus(Resource):
@@ -20,6 +24,33 @@ class ServiceStatus(Resource):
         return success_response()
 
 
+class ServiceReadiness(Resource):
+    def get(self):
+        """
+        ---
+        summary: Service readiness
+        description:
+            Method for load balancers. Unlike `/service/test` checks database connectivity (cached for a couple
+            of seconds), connection pool saturation and request log queue depth, and returns 503
+            when this node should not receive traffic
+        responses:
+            200:
+                description: Ready
+            503:
+                description: Not ready
+                content:
+                    application/json:
+                        schema: ErrorSchema
+                        example:
+                          message: [Database is unavailable]
+        """
+        ready, data = application.readiness.status()
+        if not ready:
+            return fail_response(msg=', '.join(data['reasons']), code=503, _data=data)
+
+        return success_response(_data=data)
+
+
 class CurrentServer(Resource):
     def get(self):
         """
@@ -37,7 +68,92 @@ class CurrentServer(Resource):
         hostname = socket.gethostname()
         lhostname = socket.getfqdn()
 
-        return HostSchema().dump({
+        return get_schema(HostSchema).dump({
             'host': hostname,
             'host_full': lhostname,
-        })
+        }).data
+
+
+class ServiceMetrics(Resource):
+    def get(self):
+        """
+        ---
+        summary: Service metrics
+        description:
+            Request counts, latency histograms, error counts per resource, cache hit ratios
+            and DB pool usage of all worker processes in Prometheus text format
+        responses:
+            200:
+                description: OK
+                content:
+                    text/plain:
+                        schema:
+                            type: string
+        """
+        return Response(application.metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+class ProfilesList(Resource):
+    @jwt_required
+    @manager_role_required
+    def get(self):
+        """
+        ---
+        summary: Request profiles
+        description:
+            Profiles of manager requests sent with `X-Profile` header (`1` for cProfile, `sample` for the
+            sampling profiler) or `_profile` query argument, newest first. Only the latest files are kept and
+            at most one request is profiled per `PROFILING_INTERVAL` seconds, the name of the profile
+            (or `rate-limited`) is returned in `X-Profile` response header
+        responses:
+            200:
+                description: OK
+                content:
+                    application/json:
+                        example:
+                          status: success
+                          data:
+                            profiles:
+                              - name: 1555761600123_4242_get_tests-int-test_id-submissions.prof
+                                size: 48213
+                                created: 1555761600.4
+        """
+        return success_response(profiles=application.profiles.list())
+
+
+class ProfileDownload(Resource):
+    @jwt_required
+    @manager_role_required
+    def get(self, name):
+        """
+        ---
+        summary: Request profile file
+        description:
+            `.prof` files are cProfile stats for `pstats`/snakeviz, `.speedscope.json` files open
+            in https://www.speedscope.app
+        parameters:
+            - in: path
+              required: true
+              name: name
+              schema:
+                  type: string
+        responses:
+            200:
+                description: OK
+                content:
+                    application/octet-stream:
+                        schema:
+                            type: string
+                            format: binary
+            404:
+                description: Not found
+                content:
+                    application/json:
+                        schema: ErrorSchema
+                        example:
+                          message: [Profile is not found]
+        """
+        if not application.profiles.exists(name):
+            return fail_response("Profile is not found", code=404)
+
+        return send_from_directory(application.profiles.directory, name, as_attachment=True)
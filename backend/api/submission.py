@@ -1,11 +1,13 @@
-from flask import jsonify
 from flask_jwt_extended import jwt_required
 from flask_restful import Resource
 from marshmallow import fields
 from webargs.flaskparser import use_kwargs, use_args
 
-from backend.core.schema import TestsSubmissionsSchema, TestsSubmissionWithAnswersSchema, CandidatesAnswersSchema
-from backend.helpers import success_response, fail_response, generic_response
+from backend.core.errors import SubmissionClosed
+from backend.core.schema import TestsSubmissionsSchema, TestsSubmissionWithAnswersSchema, CandidatesAnswersSchema, \
+    dump
+from backend.core.submissions import save_checkpoint
+from backend.helpers import json_response, success_response, fail_response, generic_response
 from server import application
 
 
@@ -39,17 +41,12 @@ class SubmissionsManagement(Resource):
                           message: [Submission not found]
         """
         submission = application.orm.get_submission(submission_id)
-        submission_schema = TestsSubmissionsSchema()
         if submission is None:
             return fail_response("Submission is not found", code=404)
-        res = submission_schema.dump(submission)
-        answers = application.orm.get_answers(res.data['id'])
-        json_answers = []
-        answers_schema = CandidatesAnswersSchema()
-        for answer in answers:
-            json_answers.append(answers_schema.dump(answer).data)
-        res.data.update({'answers': json_answers})
-        return jsonify(res.data)
+        res = dump(TestsSubmissionsSchema, submission)
+        answers = application.orm.get_answers(res['id'])
+        res.update({'answers': dump(CandidatesAnswersSchema, answers, many=True)})
+        return json_response(res)
 
 
 class SubmissionCheckpoint(Resource):
@@ -75,6 +72,11 @@ class SubmissionCheckpoint(Resource):
         responses:
             201:
                 description: OK
+            403:
+                description: Time is over or submission is completed
+                content:
+                    application/json:
+                        schema: ErrorSchema
             404:
                 description: Not found
                 content:
@@ -84,13 +86,10 @@ class SubmissionCheckpoint(Resource):
                           message: [Test not found]
 
         """
-        for answer in args['answers']:
-            if application.orm.is_answer_exists(submission_id, answer.question_id):
-                application.orm.update_answer(submission_id=submission_id, question_id=answer.question_id,
-                                              answer=answer.answer, grade=answer.grade, comments=answer.comments)
-            else:
-                application.orm.add_answer(submission_id=submission_id, question_id=answer.question_id,
-                                           answer=answer.answer)
+        answers = [{'question_id': answer.question_id, 'answer': answer.answer} for answer in args['answers']]
+        if save_checkpoint(application, submission_id, answers) is None:
+            return fail_response("Answers were not saved", code=500)
+
         return success_response(msg="Answers saved")
 
 
@@ -117,7 +116,19 @@ class SubmissionComplete(Resource):
                   schema: TestsSubmissionsSchema
         responses:
             201:
-                description: OK
+                description: OK, `data.score` is the score of auto-graded questions
+                content:
+                    application/json:
+                        example: {
+                            "status": "Created",
+                            "message": ["Submission completed"],
+                            "data": {"score": 12}
+                        }
+            403:
+                description: Time is over (submission is completed automatically) or it is already completed
+                content:
+                    application/json:
+                        schema: ErrorSchema
             404:
                 description: Not found
                 content:
@@ -127,9 +138,16 @@ class SubmissionComplete(Resource):
                           message: [Submission not found]
 
         """
-        found_submission_id = application.orm.get_submission(submission_id)
-        if found_submission_id is None:
-            return fail_response(msg="Submission not found", code=404)
-        application.orm.finish_submission(submission_id=submission_id)
+        application.deadlines.check_open(submission_id)
+
+        result = application.orm.finish_submission(submission_id=submission_id)
+        if result is None:
+            return fail_response(msg="Submission was not completed", code=500)
+
+        completed, score = result
+        application.deadlines.closed(submission_id)
+        if not completed:
+            # completed meanwhile by the sweeper or another worker, the deadlines cache of this one is behind
+            raise SubmissionClosed
 
-        return generic_response(status='Created', msg="Submission completed", code=201)
+        return generic_response(status='Created', msg="Submission completed", code=201, score=score)
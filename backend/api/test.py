@@ -1,14 +1,20 @@
-from flask.json import jsonify
+import json
+
+from flask import Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_current_user
 from flask_restful import Resource
 from marshmallow import fields
 from webargs.flaskparser import use_kwargs, use_args
 
 from backend.core.enums import UsersRole
-from backend.core.decorators import candidate_role_required, manager_role_required
+from backend.core.decorators import candidate_role_required, manager_role_required, university_staff_only
+from backend.core.export import FORMATS as EXPORT_FORMATS
+from backend.core.grading import grade_test
 from backend.core.models import Users
-from backend.core.schema import TestsRegistrationSchema, TestsSchema, TestsSubmissionsSchema, QuestionsSchema
-from backend.helpers import fail_response, generic_response, success_response
+from backend.core.schema import TestsRegistrationSchema, TestsSubmissionsSchema, TestsSchema, dump, dump_fields, \
+    field_attributes
+from backend.helpers import json_response, fail_response, generic_response, success_response, not_modified_response, \
+    test_etag, requested_fields
 from server import application
 
 
@@ -19,6 +25,13 @@ class TestsList(Resource):
         ---
         summary: Get all non-archived tests list
         description: All tests with links on them
+        parameters:
+            - in: query
+              name: fields
+              schema:
+                type: string
+              required: false
+              description: Comma separated list of fields to return, e.g. `id,test_name`
         responses:
             200:
                 description: OK
@@ -59,13 +72,16 @@ class TestsList(Resource):
         user: Users = get_current_user()
         if user.role == UsersRole.MANAGER or user.role == UsersRole.STAFF:
             return fail_response(msg="You are not allowed to create test", code=406)
-        tests = application.orm.get_tests()
-        if tests is None:
+        fields = requested_fields(dump_fields(TestsSchema))
+
+        summaries, body = application.tests_cache.get_active()
+        if body is None:
             return fail_response("Some problems with tests retrieving", code=404)
-        test_schema = TestsSchema(many=True)
-        res = test_schema.dump(tests)
+        if fields is not None:
+            # tests are cached anyway, narrowing the cached dicts is cheaper than a narrower query
+            return json_response([{field: summary[field] for field in fields} for summary in summaries])
 
-        return jsonify(res.data)
+        return json_response(body)
 
 
 class TestCreation(Resource):
@@ -120,6 +136,12 @@ class TestManagement(Resource):
                 type: integer
               required: true
               description: Numeric ID of the user to get
+            - in: query
+              name: fields
+              schema:
+                type: string
+              required: false
+              description: Comma separated list of fields to return, e.g. `id,test_name,questions`
         responses:
             200:
                 description: OK
@@ -156,6 +178,8 @@ class TestManagement(Resource):
                                     ],
                                     "test_name": "45"
                                 }
+            304:
+                description: Not modified, test version matches `If-None-Match` header
             404:
                 description: Not found
                 content:
@@ -164,18 +188,26 @@ class TestManagement(Resource):
                         example:
                           message: [Test not found]
         """
-        test = application.orm.get_test(test_id)
-        test_schema = TestsSchema()
+        fields = requested_fields(dump_fields(TestsSchema) + ['questions'])
+
+        test = application.tests_cache.get_test(test_id)
         if test is None:
             return fail_response("Test is not found", code=404)
-        res = test_schema.dump(test)
-        questions = []
-        questions_schema = QuestionsSchema()
-        for question_id in res.data['questions_tests']:
-            obj = application.orm.get_question(question_id)
-            questions.append(questions_schema.dump(obj).data)
-        res.data.update({'questions': questions})
-        return jsonify(res.data)
+
+        etag = test_etag(test.id, test.version)
+        not_modified = not_modified_response(etag)
+        if not_modified is not None:
+            return not_modified
+
+        if fields is None:
+            response = json_response(test.body)
+        else:
+            # questions are kept only serialized, they are parsed back when requested
+            full = json.loads(test.body) if 'questions' in fields else test.summary
+            response = json_response({field: full[field] for field in fields})
+        response.set_etag(etag)
+
+        return response
 
     @jwt_required
     @manager_role_required
@@ -274,6 +306,12 @@ class TestSubmissions(Resource):
               name: test_id
               schema:
                   type: int
+            - in: query
+              name: fields
+              schema:
+                type: string
+              required: false
+              description: Comma separated list of fields to return, e.g. `id,user,submitted`
         responses:
             200:
                 description: OK
@@ -290,11 +328,14 @@ class TestSubmissions(Resource):
                         example:
                           message: [Submission not found]
         """
-        submissions = application.orm.get_submissions(test_id)
+        fields = requested_fields(dump_fields(TestsSubmissionsSchema))
+        columns = field_attributes(TestsSubmissionsSchema, fields) if fields is not None else None
+
+        submissions = application.orm.get_submissions(test_id, columns=columns)
         if submissions is None:
             return fail_response("Submission not found", code=404)
 
-        return TestsSubmissionsSchema(many=True).dump(submissions)
+        return json_response(dump(TestsSubmissionsSchema, submissions, many=True, only=fields))
 
 
 class TestStart(Resource):
@@ -305,7 +346,9 @@ class TestStart(Resource):
         """
         ---
         summary: Test start
-        description: Starts picked test for user and creates empty submission checkpoint
+        description:
+            Starts picked test for user and creates empty submission checkpoint.
+            Answers are accepted until `deadline` (UTC), which is start time plus test `max_time` minutes
         parameters:
             - in: path
               required: true
@@ -318,8 +361,245 @@ class TestStart(Resource):
         """
         user: Users = get_current_user()
 
-        submission = application.orm.init_submission(candidate_id=user.id, test_id=test_id)
+        test = application.tests_cache.get_test(test_id)
+        if test is None:
+            return fail_response("Test is not found", code=404)
+
+        submission = application.orm.init_submission(candidate_id=user.id, test_id=test_id,
+                                                     max_time=test.summary['max_time'])
         if submission is None:
             return fail_response("Submission was not created", code=406)
+        application.deadlines.started(submission.id, submission.deadline, submission.test_id)
+
+        return success_response(msg=submission.id, code=201, _data={'deadline': submission.deadline})
+
+
+class TestGrading(Resource):
+    @jwt_required
+    @university_staff_only
+    def post(self, test_id):
+        """
+        ---
+        summary: Test autograding
+        description:
+            Grades single and multiple choice answers of all completed submissions.
+            The answer gets question points when exactly the key options are chosen, otherwise 0.
+            Manually graded and open questions are skipped. Grading again overwrites previous automatic grades
+        parameters:
+            - in: path
+              required: true
+              name: test_id
+              schema:
+                  type: int
+        responses:
+            200:
+                description: OK
+                content:
+                    application/json:
+                        example: {
+                            "status": "success",
+                            "message": ["Test graded"],
+                            "data": {"submissions": 120, "answers": 2400}
+                        }
+            404:
+                description: Not found
+                content:
+                    application/json:
+                        schema: ErrorSchema
+                        example:
+                          message: [Test is not found]
+        """
+        if application.tests_cache.get_test(test_id) is None:
+            return fail_response("Test is not found", code=404)
+
+        result = grade_test(application, test_id)
+        if result is None:
+            return fail_response("Test was not graded", code=500)
+
+        return success_response(msg="Test graded", _data=result)
+
+
+class TestRanking(Resource):
+    @jwt_required
+    @university_staff_only
+    @use_kwargs({"limit": fields.Int(location="query", missing=None)})
+    def get(self, test_id, limit):
+        """
+        ---
+        summary: Test ranking
+        description:
+            Top completed submissions by score and distribution of scores of all completed submissions.
+            Histogram bucket covers scores from `from` (inclusive) to `to`
+        parameters:
+            - in: path
+              required: true
+              name: test_id
+              schema:
+                  type: int
+            - in: query
+              name: limit
+              schema:
+                type: integer
+              required: false
+              description: Number of top submissions, 10 by default, at most 100
+        responses:
+            200:
+                description: OK
+                content:
+                    application/json:
+                        example: {
+                            "ranking": [
+                                {"id": 17, "user": 42, "score": 18, "graded_count": 20, "pending_count": 0,
+                                 "time_end": "2019-04-20T12:30:00"}
+                            ],
+                            "histogram": [
+                                {"from": 17, "to": 18, "submissions": 3},
+                                {"from": 18, "to": 19, "submissions": 1}
+                            ]
+                        }
+            404:
+                description: Not found
+                content:
+                    application/json:
+                        schema: ErrorSchema
+                        example:
+                          message: [Test is not found]
+        """
+        if application.tests_cache.get_test(test_id) is None:
+            return fail_response("Test is not found", code=404)
+
+        config = application.app.config
+        limit = min(max(limit or config['RANKING_DEFAULT_LIMIT'], 1), config['RANKING_MAX_LIMIT'])
+
+        fields = ('id', 'user', 'score', 'graded_count', 'pending_count', 'time_end')
+        ranking = application.orm.get_ranking(test_id, limit,
+                                              columns=field_attributes(TestsSubmissionsSchema, fields))
+        histogram = application.orm.get_score_histogram(test_id)
+        if ranking is None or histogram is None:
+            return fail_response("Ranking is not available", code=500)
+
+        bucket_size = config['SCORE_HISTOGRAM_BUCKET']
+
+        return json_response({
+            'ranking': dump(TestsSubmissionsSchema, ranking, many=True, only=fields),
+            'histogram': [{'from': row.bucket * bucket_size, 'to': (row.bucket + 1) * bucket_size,
+                           'submissions': row.submissions} for row in histogram],
+        })
+
+
+class TestQuestionStats(Resource):
+    @jwt_required
+    @university_staff_only
+    def get(self, test_id):
+        """
+        ---
+        summary: Question statistics
+        description:
+            Item analysis of test questions over graded answers of completed submissions.
+            `difficulty` is the mean share of question points earned (higher is easier),
+            `discrimination` is the correlation of the question score with the rest of the test score.
+            Statistics are computed by `flask question-stats` job, `null` when there is not enough data
+        parameters:
+            - in: path
+              required: true
+              name: test_id
+              schema:
+                  type: int
+        responses:
+            200:
+                description: OK
+                content:
+                    application/json:
+                        example: [
+                            {"question_id": 5, "answers": 1200, "difficulty": 0.64, "discrimination": 0.41,
+                             "computed_at": "2019-04-21T03:00:00"}
+                        ]
+            404:
+                description: Not found
+                content:
+                    application/json:
+                        schema: ErrorSchema
+                        example:
+                          message: [Test is not found]
+        """
+        if application.tests_cache.get_test(test_id) is None:
+            return fail_response("Test is not found", code=404)
+
+        stats = application.orm.get_question_stats(test_id)
+        if stats is None:
+            return fail_response("Statistics are not available", code=500)
+
+        return json_response([{'question_id': row.question_id, 'answers': row.answers, 'difficulty': row.difficulty,
+                               'discrimination': row.discrimination, 'computed_at': row.computed_at}
+                              for row in stats])
+
+
+class TestExport(Resource):
+    @jwt_required
+    @university_staff_only
+    @use_kwargs({"export_format": fields.Str(location="query", load_from="format", missing='csv')})
+    def get(self, test_id, export_format):
+        """
+        ---
+        summary: Test answers export
+        description:
+            All answers of all submissions of the test with candidate names, one row per answer.
+            Output is streamed, in CSV (options of an answer are separated by `; `) or newline delimited JSON
+        parameters:
+            - in: path
+              required: true
+              name: test_id
+              schema:
+                  type: int
+            - in: query
+              name: format
+              schema:
+                type: string
+                enum: [csv, ndjson]
+              required: false
+              description: Output format, `csv` by default
+        responses:
+            200:
+                description: OK
+                content:
+                    text/csv:
+                        example: |
+                            submission_id,candidate_id,first_name,last_name,time_start,time_end,submitted,score,question_id,answer,grade,comments
+                            17,42,Ivan,Ivanov,2019-04-20T12:00:00,2019-04-20T12:30:00,True,18,5,a; c,2,
+                    application/x-ndjson:
+                        example: |
+                            {"submission_id":17,"candidate_id":42,"first_name":"Ivan","last_name":"Ivanov","time_start":"2019-04-20T12:00:00","time_end":"2019-04-20T12:30:00","submitted":true,"score":18,"question_id":5,"answer":["a","c"],"grade":2,"comments":null}
+            400:
+                description: Unknown format
+                content:
+                    application/json:
+                        schema: ErrorSchema
+            404:
+                description: Not found
+                content:
+                    application/json:
+                        schema: ErrorSchema
+                        example:
+                          message: [Test is not found]
+        """
+        if export_format not in EXPORT_FORMATS:
+            return fail_response("Unknown export format, use one of: " + ', '.join(EXPORT_FORMATS), code=400)
+        if application.tests_cache.get_test(test_id) is None:
+            return fail_response("Test is not found", code=404)
+
+        mimetype, encode = EXPORT_FORMATS[export_format]
+        chunks = application.orm.stream_test_export(test_id, application.app.config['EXPORT_CHUNK_SIZE'])
+
+        def generate():
+            try:
+                yield from encode(chunks)
+            except Exception as excpt:
+                # headers are sent already, only an aborted connection tells the client the file is incomplete
+                application.db.session.rollback()
+                print(f'Couldn\'t export test {test_id}: {excpt}')
+                raise
+
+        response = Response(stream_with_context(generate()), mimetype=mimetype)
+        response.headers['Content-Disposition'] = 'attachment; filename="test-{}.{}"'.format(test_id, export_format)
 
-        return success_response(msg=submission.id, code=201)
+        return response
@@ -1,3 +1,7 @@
+import os
+import tempfile
+
+
 class Config(object):
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_BLACKLIST_ENABLED = True
@@ -11,6 +15,76 @@ class Config(object):
     STATIC_URL_PATH = '/static'
     STATIC_FOLDER = 'public'
 
+    # directory shared by all worker processes
+    METRICS_DIR = os.path.join(tempfile.gettempdir(), 'admission-forms-metrics')
+    METRICS_FLUSH_INTERVAL = 5
+
+    # readiness probe: seconds / share of pool capacity / queued records
+    READINESS_DB_TIMEOUT = 1
+    READINESS_CACHE_TTL = 2
+    READINESS_MAX_POOL_SATURATION = 0.9
+    READINESS_MAX_QUEUE_DEPTH = 5000
+
+    REQUEST_LOG_QUEUE_SIZE = 10000
+
+    # build response dicts of the hot read endpoints straight from model columns
+    SERIALIZER_FAST_DUMP = True
+    # 'auto' uses orjson when it is installed, 'orjson' or 'stdlib' force the backend
+    JSON_BACKEND = 'auto'
+
+    # responses smaller than this are sent as is, gzip level / brotli quality for dynamic responses
+    COMPRESSION_MIN_SIZE = 1024
+    COMPRESSION_GZIP_LEVEL = 5
+    COMPRESSION_BROTLI_QUALITY = 4
+    STATIC_MAX_AGE = 7 * 24 * 3600
+
+    # production server (gunicorn.conf.py). Workers: None means 2 * CPU + 1
+    # worker class: 'sync', 'gthread' (SERVER_THREADS per worker) or 'gevent' (SERVER_WORKER_CONNECTIONS per worker)
+    SERVER_BIND = '0.0.0.0:8000'
+    SERVER_WORKERS = None
+    SERVER_WORKER_CLASS = 'gthread'
+    SERVER_THREADS = 4
+    SERVER_WORKER_CONNECTIONS = 1000
+    SERVER_KEEPALIVE = 5
+    SERVER_TIMEOUT = 30
+    SERVER_GRACEFUL_TIMEOUT = 30
+    SERVER_MAX_REQUESTS = 0
+
+    # ASGI autosave sidecar (asgi.py): threads doing database work, keep within the connection pool size
+    AUTOSAVE_DB_THREADS = 8
+
+    # seconds after the deadline when answers are still accepted (network latency)
+    SUBMISSION_GRACE_PERIOD = 15
+    # expired submissions are completed every SWEEPER_INTERVAL seconds, SWEEPER_BATCH_SIZE per statement
+    SWEEPER_INTERVAL = 10
+    SWEEPER_BATCH_SIZE = 500
+
+    # width of score histogram buckets, in points; after changing it run `flask rebuild-scores`
+    SCORE_HISTOGRAM_BUCKET = 1
+    RANKING_DEFAULT_LIMIT = 10
+    RANKING_MAX_LIMIT = 100
+
+    # manual grading queue: claimed answers are reserved for the grader for GRADING_LEASE seconds
+    GRADING_LEASE = 300
+    GRADING_MAX_CLAIM = 50
+
+    # rows fetched at once from the server-side cursor by `flask question-stats`
+    ANALYTICS_CHUNK_SIZE = 10000
+    # rows per output chunk of `/tests/<id>/export`
+    EXPORT_CHUNK_SIZE = 1000
+
+    # candidates bulk import: rows per request and processes hashing passwords
+    IMPORT_MAX_ROWS = 50000
+    IMPORT_HASH_PROCESSES = 4
+
+    # on-demand profiling of manager requests (`X-Profile` header): ring directory shared by all workers
+    # (defaults to the system temp dir), at most one profiled request per interval in seconds across workers
+    PROFILING_ENABLED = True
+    PROFILING_DIR = None
+    PROFILING_MAX_FILES = 50
+    PROFILING_INTERVAL = 10
+    PROFILING_SAMPLE_INTERVAL = 0.001
+
 
 API_VERSION_NUMBER = '0.0.7'
 API_VERSION_LABEL = 'v1'
@@ -0,0 +1,98 @@
+from typing import Optional
+
+import numpy as np
+
+from backend.core.backend_app import FormsBackend
+
+
+class ItemStatistics(object):
+    """
+    Streaming per-question sums for classical item analysis. Item score `x` is the answer grade divided by
+    question points, rest score `y` is the submission score without this answer.
+
+    Difficulty index is the mean of `x` (share of points earned, higher is easier), discrimination index is
+    the corrected item-total (point-biserial) correlation of `x` and `y`. Only sums are kept, so memory
+    does not depend on the number of submissions
+    """
+
+    def __init__(self, question_ids: [int], points: [float]):
+        self.question_ids = np.array(question_ids, dtype=np.int64)
+        self.points = np.array(points, dtype=np.float64)
+
+        self._order = np.argsort(self.question_ids)
+        size = len(self.question_ids)
+        self.n = np.zeros(size)
+        self.sum_x = np.zeros(size)
+        self.sum_y = np.zeros(size)
+        self.sum_xx = np.zeros(size)
+        self.sum_yy = np.zeros(size)
+        self.sum_xy = np.zeros(size)
+
+    def add(self, question_ids: np.ndarray, grades: np.ndarray, scores: np.ndarray):
+        """
+        Adds a chunk of graded answers, arrays are parallel
+        """
+        if not len(self.question_ids) or not len(question_ids):
+            return
+
+        sorted_ids = self.question_ids[self._order]
+        found = np.minimum(np.searchsorted(sorted_ids, question_ids), len(sorted_ids) - 1)
+        known = sorted_ids[found] == question_ids
+        positions = self._order[found[known]]
+        grades, scores = grades[known], scores[known]
+
+        points = self.points[positions]
+        x = np.where(points > 0, grades / np.where(points > 0, points, 1), (grades > 0).astype(np.float64))
+        y = scores - grades
+
+        size = len(self.question_ids)
+        self.n += np.bincount(positions, minlength=size)
+        self.sum_x += np.bincount(positions, weights=x, minlength=size)
+        self.sum_y += np.bincount(positions, weights=y, minlength=size)
+        self.sum_xx += np.bincount(positions, weights=x * x, minlength=size)
+        self.sum_yy += np.bincount(positions, weights=y * y, minlength=size)
+        self.sum_xy += np.bincount(positions, weights=x * y, minlength=size)
+
+    def result(self) -> (np.ndarray, np.ndarray, np.ndarray):
+        """
+        :return: answers count, difficulty and discrimination per question, NaN where it is undefined
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            difficulty = self.sum_x / self.n
+            covariance = self.n * self.sum_xy - self.sum_x * self.sum_y
+            spread = (self.n * self.sum_xx - self.sum_x ** 2) * (self.n * self.sum_yy - self.sum_y ** 2)
+            discrimination = np.where(spread > 0, covariance / np.sqrt(np.where(spread > 0, spread, 1)), np.nan)
+
+        return self.n.astype(np.int64), difficulty, discrimination
+
+
+def compute_question_stats(application: FormsBackend, test_id: int) -> Optional[int]:
+    """
+    Recomputes statistics of all questions of the test from graded answers of completed submissions.
+    Answers are read through a server-side cursor in chunks of ANALYTICS_CHUNK_SIZE rows
+    :return: number of questions with statistics or None in case of error
+    """
+    orm = application.orm
+
+    questions = orm.get_answer_key(test_id)
+    if questions is None:
+        return None
+
+    stats = ItemStatistics([question.id for question in questions], [question.points or 0 for question in questions])
+    try:
+        for rows in orm.stream_graded_answers(test_id, application.app.config['ANALYTICS_CHUNK_SIZE']):
+            stats.add(np.array([row.question_id for row in rows], dtype=np.int64),
+                      np.array([row.grade for row in rows], dtype=np.float64),
+                      np.array([row.score or 0 for row in rows], dtype=np.float64))
+    except Exception as excpt:
+        orm.session.rollback()
+        print(f'Couldn\'t read answers: {excpt}')
+        return None
+
+    counts, difficulty, discrimination = stats.result()
+
+    def optional(values):
+        return [None if np.isnan(value) else float(value) for value in values]
+
+    return orm.save_question_stats(test_id, stats.question_ids.tolist(), counts.tolist(),
+                                   optional(difficulty), optional(discrimination))
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.core.backend_app import FormsBackend
+from backend.core.enums import TokenType, UsersRole
+from backend.core.errors import SubmissionClosed, SubmissionNotFound
+from backend.core.submissions import save_checkpoint
+
+SUBMISSION_PATH = re.compile(r'^/submissions/(\d+)/autosave/?$')
+
+# WebSocket close codes, 4000-4999 are reserved for applications
+CLOSE_NOT_FOUND = 4004
+CLOSE_UNAUTHORIZED = 4001
+CLOSE_FORBIDDEN = 4003
+CLOSE_TOKEN_EXPIRED = 4019
+
+
+class AutosaveError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class AutosaveApp(object):
+    """
+    ASGI application with WebSocket autosave channel: `ws://<host>/submissions/<id>/autosave`
+
+    The first message authenticates the connection: `{"access_token": "<JWT>"}`. After that every message
+    `{"answers": [{"question_id": 1, "answer": ["a"]}, ...]}` is saved with the same logic as
+    `PUT /submissions/<id>/checkpoint` and acknowledged with `{"status": "success", "saved": <n>}`.
+    Token signature, blacklist and user are checked once per connection, expiration on every message.
+
+    Database work runs in a thread pool inside Flask app context, so the event loop never blocks.
+    """
+
+    def __init__(self, application: FormsBackend):
+        self.application = application
+        self.executor = ThreadPoolExecutor(max_workers=application.app.config['AUTOSAVE_DB_THREADS'],
+                                           thread_name_prefix='autosave')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'websocket':
+            await self._websocket(scope, receive, send)
+        else:
+            await send({'type': 'http.response.start', 'status': 404,
+                        'headers': [(b'content-type', b'application/json')]})
+            await send({'type': 'http.response.body', 'body': b'{"status":"fail","message":["Not found"]}'})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _run(self, fn, *args):
+        def in_app_context():
+            # app context teardown returns session connection to the pool
+            with self.application.app.app_context():
+                return fn(*args)
+
+        return asyncio.get_event_loop().run_in_executor(self.executor, in_app_context)
+
+    async def _websocket(self, scope, receive, send):
+        match = SUBMISSION_PATH.match(scope['path'])
+        message = await receive()
+        if message['type'] != 'websocket.connect':
+            return
+        if match is None:
+            await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+            return
+
+        submission_id = int(match.group(1))
+        await send({'type': 'websocket.accept'})
+
+        expires = None
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+
+            try:
+                data = json.loads(message.get('text') or message.get('bytes') or b'')
+                if not isinstance(data, dict):
+                    raise ValueError
+
+                if expires is None:
+                    expires = await self._run(self._authenticate, submission_id, data.get('access_token'))
+                    await self._send_json(send, {'status': 'success', 'message': ['Authenticated']})
+                    continue
+
+                if time.time() >= expires:
+                    raise AutosaveError(CLOSE_TOKEN_EXPIRED, 'Your token is expired.')
+
+                answers = self._parse_answers(data)
+                try:
+                    saved = await self._run(save_checkpoint, self.application, submission_id, answers)
+                except SubmissionClosed:
+                    raise AutosaveError(CLOSE_FORBIDDEN, 'Submission is closed, time is over')
+                except SubmissionNotFound:
+                    raise AutosaveError(CLOSE_NOT_FOUND, 'Submission not found')
+                if saved is None:
+                    await self._send_json(send, {'status': 'fail', 'message': ['Answers were not saved']})
+                else:
+                    await self._send_json(send, {'status': 'success', 'saved': saved})
+            except AutosaveError as err:
+                await self._send_json(send, {'status': 'fail', 'message': [err.message]})
+                await send({'type': 'websocket.close', 'code': err.code})
+                return
+            except (ValueError, TypeError, KeyError):
+                await self._send_json(send, {'status': 'fail', 'message': ['Invalid message']})
+
+    @staticmethod
+    async def _send_json(send, data):
+        await send({'type': 'websocket.send', 'text': json.dumps(data)})
+
+    @staticmethod
+    def _parse_answers(data) -> [dict]:
+        answers = []
+        for answer in data['answers']:
+            value = answer['answer']
+            answers.append({
+                'question_id': int(answer['question_id']),
+                'answer': [str(item) for item in value] if isinstance(value, list) else [str(value)],
+            })
+
+        return answers
+
+    def _authenticate(self, submission_id: int, token: str) -> float:
+        """
+        Same checks as `@jwt_required` with the blacklist and user loader callbacks, plus submission ownership
+        :return: token expiration timestamp
+        """
+        from flask_jwt_extended import decode_token
+        from jwt import ExpiredSignatureError, InvalidTokenError
+
+        if not token:
+            raise AutosaveError(CLOSE_UNAUTHORIZED, 'Authorization token not provided.')
+
+        try:
+            decoded = decode_token(token)
+        except ExpiredSignatureError:
+            raise AutosaveError(CLOSE_TOKEN_EXPIRED, 'Your token is expired.')
+        except InvalidTokenError:
+            raise AutosaveError(CLOSE_UNAUTHORIZED, 'Invalid token.')
+
+        if decoded.get('type') != TokenType.ACCESS.value:
+            raise AutosaveError(CLOSE_UNAUTHORIZED, 'Provided wrong type of token.')
+
+        orm = self.application.orm
+        stored = orm.get_token_by_jti(decoded['jti'])
+        if stored is not None and stored.revoked:
+            raise AutosaveError(CLOSE_UNAUTHORIZED, 'Your token has been revoked.')
+
+        user_auth = orm.get_user_auth_by_email(decoded['identity'])
+        if user_auth is None or user_auth.user.role != UsersRole.CANDIDATE.value:
+            raise AutosaveError(CLOSE_FORBIDDEN, 'You have insufficient rights for this action.')
+
+        submission = orm.get_submission(submission_id)
+        if submission is None or submission.candidate_id != user_auth.user.id:
+            raise AutosaveError(CLOSE_NOT_FOUND, 'Submission not found')
+        if submission.submitted:
+            raise AutosaveError(CLOSE_FORBIDDEN, 'Submission is already completed')
+        self.application.deadlines.started(submission.id, submission.deadline, submission.test_id)
+
+        return decoded['exp']
@@ -22,10 +22,21 @@ except ImportError:
 
 class FormsBackend(object):
     orm = None
+    metrics = None
+    log_writer = None
+    readiness = None
+    tests_cache = None
+    deadlines = None
+    sweeper = None
+    profiles = None
 
     def __init__(self, flask_app):
         self.app = flask_app
         self.app.config.from_object(Config)
+        self.route_names = {}
+        self.initialized = False
+        self._resources = []
+        self._spec_built = False
 
         self.api = Api(self.app, errors=error_descriptions)
         self.db = SQLAlchemy(self.app)
@@ -35,14 +46,34 @@ class FormsBackend(object):
         self.ma = Marshmallow(self.app)
         self.spec = self._init_api_spec()
 
-    def init(self):
+    def init(self, with_spec: bool = False):
+        """
+        Builds ORM and routes. OpenAPI paths are registered only when `with_spec` is set,
+        otherwise they are built on the first `build_spec` call
+        """
         from backend.core.models import ORM
         self.orm = ORM(self.db)
 
         self._add_routes(self._get_routes())
+        self.initialized = True
+
+        if with_spec:
+            self.build_spec()
+
+    def build_spec(self):
+        """
+        Registers paths of all added resources in the spec, only once
+        """
+        if self._spec_built:
+            return
+
+        for resource, root_name in self._resources:
+            self._add_resource_spec(resource, root_name)
+
+        self._spec_built = True
 
     def _get_routes(self):
-        from backend.api import auth, profile, test, submission, service
+        from backend.api import auth, profile, test, submission, service, grading
 
         return {
             'auth': {
@@ -56,6 +87,7 @@ class FormsBackend(object):
                     '': profile.UserProfile,
                 },
                 'register': profile.UserRegistration,
+                'import': profile.CandidatesImport,
                 'list': {
                     '<int:page>': {
                         '': profile.UsersList
@@ -67,6 +99,10 @@ class FormsBackend(object):
                     '': test.TestManagement,
                     'start': test.TestStart,
                     'submissions': test.TestSubmissions,
+                    'grade': test.TestGrading,
+                    'ranking': test.TestRanking,
+                    'stats': test.TestQuestionStats,
+                    'export': test.TestExport,
                 },
                 'list': test.TestsList,
                 'create': test.TestCreation,
@@ -78,9 +114,19 @@ class FormsBackend(object):
                     'complete': submission.SubmissionComplete,
                 },
             },
+            'grading': {
+                'next': grading.GradingNext,
+                'submit': grading.GradingSubmit,
+            },
             'service': {
                 'test': service.ServiceStatus,
                 'host': service.CurrentServer,
+                'metrics': service.ServiceMetrics,
+                'ready': service.ServiceReadiness,
+                'profiles': {
+                    '': service.ProfilesList,
+                    '<string:name>': service.ProfileDownload,
+                },
             },
         }
 
@@ -126,7 +172,8 @@ class FormsBackend(object):
     def _add_resource(self, resource: Resource.__class__, path: str, root_name: str = None):
         # print(path)
         self.api.add_resource(resource, path)
-        self._add_resource_spec(resource, root_name)
+        self.route_names[resource.__name__.lower()] = path.lstrip('/')
+        self._resources.append((resource, root_name))
 
     def _add_resource_spec(self, resource: Resource.__class__, root_name: str = None):
         """
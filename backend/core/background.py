@@ -0,0 +1,127 @@
+import json
+import os
+import queue
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from backend.core.backend_app import FormsBackend
+
+
+class BackgroundWorker(ABC):
+    """
+    Daemon thread bound to the process that started it.
+
+    Threads do not survive `fork()`, so `ensure_started` compares pids and starts a fresh thread
+    in a forked worker instead of relying on the one created in the master process.
+    """
+    name = 'background-worker'
+
+    def __init__(self, application: FormsBackend):
+        self.application = application
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+
+            self._on_fork()
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+            if not self._thread.is_alive():
+                self._on_stop()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as excpt:
+                print(f'{self.name} failed: {excpt}')
+                self._stop.wait(1)
+
+    def _on_fork(self):
+        """
+        Resets state inherited from the parent process
+        """
+        pass
+
+    def _on_stop(self):
+        """
+        Releases resources of the stopped thread, called in the process that owns it
+        """
+        pass
+
+    @abstractmethod
+    def run_once(self):
+        """
+        One iteration of the work, called in a loop until `stop`. Waits on its own (e.g. `self._stop.wait`)
+        when there is nothing to do
+        """
+
+
+class RequestLogWriter(BackgroundWorker):
+    """
+    Moves `request_log` inserts out of the request path and writes them in batches
+    """
+    name = 'request-log-writer'
+
+    def __init__(self, application: FormsBackend, max_size: int = 10000, batch_size: int = 100):
+        super().__init__(application)
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_size)
+
+    def _on_fork(self):
+        # records queued by the parent are written by the parent
+        self._queue = queue.Queue(maxsize=self.max_size)
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._pid == os.getpid() else 0
+
+    def put(self, user_id, role, method, path, data):
+        if data is not None and not isinstance(data, str):
+            data = json.dumps(data, default=str)
+
+        record = {'user_id': user_id, 'role': role, 'method': method, 'path': path, 'data': data,
+                  'date': datetime.utcnow()}
+
+        self.ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            # the log is an audit trail, so under overload it is written synchronously instead of dropped
+            self.application.orm.add_log(user_id, role, method, path, data)
+
+    def run_once(self):
+        try:
+            batch = [self._queue.get(timeout=1)]
+        except queue.Empty:
+            return
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        from backend.core.models import RequestLog
+
+        try:
+            with self.application.db.engine.begin() as connection:
+                connection.execute(RequestLog.__table__.insert(), batch)
+        except Exception as excpt:
+            print(f'Couldn\'t write {len(batch)} log records: {excpt}')
@@ -0,0 +1,228 @@
+import select
+import threading
+
+import psycopg2
+
+from backend.core.background import BackgroundWorker
+from backend.core.backend_app import FormsBackend
+
+TESTS_CHANNEL = 'tests_changed'
+
+
+class CachedTest(object):
+    __slots__ = ('id', 'version', 'summary', 'body', 'answer_key')
+
+    def __init__(self, test_id: int, version: int, summary: dict, body: bytes, answer_key=None):
+        self.id = test_id
+        self.version = version
+        # test without questions, as it is shown in the tests list
+        self.summary = summary
+        # serialized test with questions
+        self.body = body
+        # `grading.AnswerKey` of auto-graded questions, for grading answers as they arrive
+        self.answer_key = answer_key
+
+
+class TestsCache(object):
+    """
+    Per-process cache of serialized tests.
+
+    Entries are dropped by the ORM methods that change tests and, for the other workers,
+    by `TestsChangesListener` that receives `NOTIFY tests_changed, '<test_id>'` sent in the same transaction.
+    """
+
+    def __init__(self, application: FormsBackend):
+        self.application = application
+        self.listener = TestsChangesListener(application, self)
+
+        self._lock = threading.Lock()
+        self._tests = {}
+        self._active = None
+        # incremented on every invalidation, loads started before it are not stored
+        self._generation = 0
+
+    def get_test(self, test_id: int) -> CachedTest:
+        self.listener.ensure_started()
+
+        cached = self._tests.get(test_id)
+        if cached is not None:
+            self.application.metrics.cache_hit('tests')
+            return cached
+
+        self.application.metrics.cache_miss('tests')
+
+        return self._load_test(test_id)
+
+    def get_active(self) -> (list, bytes):
+        """
+        Non-archived tests as list of dicts and serialized
+        """
+        self.listener.ensure_started()
+
+        active = self._active
+        if active is not None:
+            self.application.metrics.cache_hit('tests_list')
+            return active
+
+        self.application.metrics.cache_miss('tests_list')
+
+        generation = self._generation
+        tests = self.application.orm.get_tests()
+        if tests is None:
+            return None, None
+
+        from backend.core.schema import TestsSchema, dump
+        from backend.core.serialization import dumps
+
+        summaries = dump(TestsSchema, tests, many=True)
+        active = (summaries, dumps(summaries))
+        with self._lock:
+            if generation == self._generation:
+                self._active = active
+
+        return active
+
+    def _load_test(self, test_id: int):
+        from backend.core.grading import AnswerKey
+        from backend.core.schema import TestsSchema, QuestionsSchema, dump
+        from backend.core.serialization import dumps
+
+        generation = self._generation
+
+        test = self.application.orm.get_test(test_id)
+        if test is None:
+            return None
+
+        summary = dump(TestsSchema, test)
+        questions = [self.application.orm.get_question(question_id) for question_id in summary['questions_tests']]
+        questions = [question for question in questions if question is not None]
+        cached = CachedTest(test.id, test.version, summary,
+                            dumps({**summary, 'questions': dump(QuestionsSchema, questions, many=True)}),
+                            AnswerKey(questions))
+
+        with self._lock:
+            if generation == self._generation:
+                current = self._tests.get(test_id)
+                if current is None or current.version <= cached.version:
+                    self._tests[test_id] = cached
+
+        return cached
+
+    def invalidate(self, test_id: int = None):
+        """
+        Drops given test (or all tests) together with the tests list
+        """
+        with self._lock:
+            self._generation += 1
+            self._active = None
+
+            if test_id is None:
+                self._tests.clear()
+            else:
+                self._tests.pop(test_id, None)
+
+    def revalidate(self):
+        """
+        Drops entries whose version differs from the database one, e.g. in a worker forked from a master
+        that warmed the cache a while ago. The tests list is cheap to rebuild and is always dropped
+        """
+        try:
+            versions = self.application.orm.get_tests_versions()
+        finally:
+            self.application.db.session.remove()
+
+        if versions is None:
+            self.invalidate()
+            return
+
+        with self._lock:
+            self._generation += 1
+            self._active = None
+
+            for test_id in [test_id for test_id, cached in self._tests.items()
+                            if versions.get(test_id) != cached.version]:
+                self._tests.pop(test_id, None)
+
+    def warm(self):
+        """
+        Loads all non-archived tests. Called at startup, before the first exam requests arrive
+        """
+        try:
+            self.get_active()
+            for test in self.application.orm.get_tests() or []:
+                self.get_test(test.id)
+        except Exception as excpt:
+            print(f'Could not warm tests cache: {excpt}')
+        finally:
+            # warm-up is done outside of requests, return connection to the pool
+            self.application.db.session.remove()
+
+
+class TestsChangesListener(BackgroundWorker):
+    """
+    Listens to `tests_changed` channel on a dedicated connection and invalidates the cache
+    """
+    name = 'tests-changes-listener'
+
+    def __init__(self, application: FormsBackend, cache: TestsCache, poll_timeout: float = 5.0):
+        super().__init__(application)
+        self.cache = cache
+        self.poll_timeout = poll_timeout
+        self._connection = None
+
+    def _on_fork(self):
+        # the socket belongs to the parent process
+        self._connection = None
+
+    def _on_stop(self):
+        # an unread listening session holds back the server NOTIFY queue, e.g. in the preload master
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except psycopg2.Error:
+                pass
+            self._connection = None
+
+    def _connect(self):
+        url = self.application.db.engine.url
+        # query parameters (sslmode, options, socket host) must match the ones of the engine
+        connection = psycopg2.connect(**url.translate_connect_args(database='dbname', username='user'), **url.query)
+        connection.set_session(autocommit=True)
+        with connection.cursor() as cursor:
+            cursor.execute('LISTEN {}'.format(TESTS_CHANNEL))
+
+        self._connection = connection
+        # tests cached before LISTEN became active (warm-up, first requests, failed connects) could have changed
+        # unnoticed, versions tell which ones
+        with self.application.app.app_context():
+            self.cache.revalidate()
+
+    def run_once(self):
+        if self._connection is None:
+            try:
+                self._connect()
+            except psycopg2.Error as excpt:
+                print(f'Could not listen for tests changes: {excpt}')
+                self._stop.wait(self.poll_timeout)
+                return
+
+        try:
+            readable, _, _ = select.select([self._connection], [], [], self.poll_timeout)
+            if not readable:
+                return
+
+            self._connection.poll()
+            while self._connection.notifies:
+                notify = self._connection.notifies.pop(0)
+                try:
+                    self.cache.invalidate(int(notify.payload))
+                except ValueError:
+                    self.cache.invalidate()
+        except (psycopg2.Error, OSError) as excpt:
+            print(f'Lost tests changes connection: {excpt}')
+            try:
+                self._connection.close()
+            except psycopg2.Error:
+                pass
+            self._connection = None
+            self.cache.invalidate()
@@ -0,0 +1,116 @@
+import gzip
+import mimetypes
+import os
+
+from flask import request, send_from_directory
+
+from backend.config.main import SPEC_FILENAME
+from backend.core.backend_app import FormsBackend
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# in order of preference
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+PRECOMPRESSED_EXTENSIONS = {'br': '.br', 'gzip': '.gz'}
+# rewritten on deploy under the same URL: revalidated by ETag on every use instead of cached for STATIC_MAX_AGE
+REVALIDATED_FILES = (SPEC_FILENAME, )
+
+
+def compress(data: bytes, encoding: str, level: int = None) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if level is None else level)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9 if level is None else level)
+
+    raise ValueError(f'Unsupported encoding {encoding}')
+
+
+def write_precompressed(path: str, data: bytes = None):
+    """
+    Writes `.gz` and `.br` variants next to the file with maximal compression level
+    :param data: content of the file, read from `path` if not given
+    """
+    from backend.helpers import write_atomic
+
+    if data is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+
+    for encoding in ENCODINGS:
+        write_atomic(path + PRECOMPRESSED_EXTENSIONS[encoding], compress(data, encoding))
+
+
+def _accepted_encoding():
+    accepted = request.accept_encodings
+    for encoding in ENCODINGS:
+        if accepted[encoding]:
+            return encoding
+
+    return None
+
+
+def application_add_compression(application: FormsBackend):
+    """
+    Compresses JSON responses above `COMPRESSION_MIN_SIZE` and serves precompressed static files
+    """
+    app = application.app
+    min_size = app.config['COMPRESSION_MIN_SIZE']
+    levels = {'br': app.config['COMPRESSION_BROTLI_QUALITY'], 'gzip': app.config['COMPRESSION_GZIP_LEVEL']}
+
+    @app.after_request
+    def compress_response(response):
+        if response.direct_passthrough or response.is_streamed or response.status_code != 200 \
+                or 'Content-Encoding' in response.headers or response.mimetype != 'application/json':
+            return response
+
+        response.vary.add('Accept-Encoding')
+
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        encoding = _accepted_encoding()
+        if encoding is None:
+            return response
+
+        response.set_data(compress(data, encoding, levels[encoding]))
+        response.headers['Content-Encoding'] = encoding
+
+        # representations with different encodings must have different strong ETags
+        etag, weak = response.get_etag()
+        if etag is not None:
+            response.set_etag('{}-{}'.format(etag, encoding), weak=weak)
+
+        return response
+
+    static_folder = app.static_folder
+    cache_timeout = app.config['STATIC_MAX_AGE']
+
+    def send(filename, path, **options):
+        revalidated = filename in REVALIDATED_FILES
+        response = send_from_directory(static_folder, path, cache_timeout=0 if revalidated else cache_timeout,
+                                       conditional=True, **options)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        if revalidated:
+            response.cache_control.no_cache = True
+
+        return response
+
+    def static(filename):
+        encoding = _accepted_encoding()
+        if encoding is not None:
+            compressed = filename + PRECOMPRESSED_EXTENSIONS[encoding]
+            if os.path.isfile(os.path.join(static_folder, compressed)):
+                mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                response = send(filename, compressed, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+
+                return response
+
+        return send(filename, filename)
+
+    app.view_functions['static'] = static
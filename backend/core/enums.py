@@ -35,3 +35,12 @@ class CandidateStatus(EnumExtended):
     PENDING = 1
     FAILED = 4
     PASSED = 5
+
+
+class QuestionType(EnumExtended):
+    """
+    Choice questions keep the key in `Questions.answer` as comma separated options, e.g. `b` or `a, c`
+    """
+    OPEN = 0
+    SINGLE_CHOICE = 1
+    MULTIPLE_CHOICE = 2
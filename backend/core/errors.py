@@ -15,6 +15,14 @@ error_descriptions = {
         'message': ["A resource with that ID no longer exists."],
         'status': 410,
     },
+    'SubmissionClosed': {
+        'message': ["Submission is closed, time is over or it is already completed."],
+        'status': 403,
+    },
+    'SubmissionNotFound': {
+        'message': ["Submission not found"],
+        'status': 404,
+    },
     'ExpiredSignatureError': {
         'message': ["Your token is expired."],
         'status': 419,
@@ -27,6 +35,10 @@ error_descriptions = {
         'message': ["Provided wrong type of token."],
         'status': 450,
     },
+    'UnknownFields': {
+        'message': ["Unknown fields requested."],
+        'status': 400,
+    },
     'WrongApplicationCode': {
         'message': ["Wrong configuration of endpoint. Check logs for more information."],
         'status': 520
@@ -44,3 +56,15 @@ class UserDoesNotExist(Exception):
 
 class WrongApplicationCode(Exception):
     pass
+
+
+class UnknownFields(Exception):
+    pass
+
+
+class SubmissionClosed(Exception):
+    pass
+
+
+class SubmissionNotFound(Exception):
+    pass
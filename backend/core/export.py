@@ -0,0 +1,57 @@
+import csv
+import io
+
+from backend.core.serialization import dumps
+
+EXPORT_COLUMNS = ('submission_id', 'candidate_id', 'first_name', 'last_name', 'time_start', 'time_end', 'submitted',
+                  'score', 'question_id', 'answer', 'grade', 'comments')
+
+# options of one answer in a CSV cell
+CSV_ANSWER_SEPARATOR = '; '
+# spreadsheets run cells starting with these as formulas
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_chunks(chunks):
+    """
+    Encodes chunks of export rows as CSV, one output piece per chunk
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue().encode('utf-8')
+
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_value(value, name) for name, value in zip(EXPORT_COLUMNS, row)] for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _csv_value(value, name):
+    if value is None:
+        return ''
+    if name == 'answer':
+        value = CSV_ANSWER_SEPARATOR.join(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        # answers and names come from candidates, they must stay text when staff open the file
+        return "'" + value
+
+    return value
+
+
+def ndjson_chunks(chunks):
+    """
+    Encodes chunks of export rows as newline delimited JSON objects, one output piece per chunk
+    """
+    for rows in chunks:
+        yield b''.join(dumps(dict(zip(EXPORT_COLUMNS, row))) + b'\n' for row in rows)
+
+
+FORMATS = {
+    'csv': ('text/csv', csv_chunks),
+    'ndjson': ('application/x-ndjson', ndjson_chunks),
+}
@@ -1,14 +1,30 @@
-from flask import jsonify
+import click
 from flask_jwt_extended import jwt_required, jwt_optional
 
 from backend.core.backend_app import FormsBackend
+from backend.helpers import json_response
 
 
 def application_extend(application: FormsBackend):
     from backend.core.models import Users
     from backend.core.enums import UsersRole
+    from backend.core.background import RequestLogWriter
+    from backend.core.health import ReadinessProbe
+    from backend.core.cache import TestsCache
+    from backend.core.submissions import SubmissionDeadlines, SubmissionsSweeper
     from flask_jwt_extended import get_current_user
 
+    application.log_writer = RequestLogWriter(application, max_size=application.app.config['REQUEST_LOG_QUEUE_SIZE'])
+    application.readiness = ReadinessProbe(application)
+    application.tests_cache = TestsCache(application)
+    application.deadlines = SubmissionDeadlines(application)
+    application.sweeper = SubmissionsSweeper(application)
+
+    if application.metrics is not None:
+        application.metrics.add_gauge_source('request_log', lambda: {
+            'request_log_queue_depth': application.log_writer.depth(),
+        })
+
     @application.jwt.token_in_blacklist_loader
     def check_if_token_in_blacklist(decrypted_token):
         jti = decrypted_token['jti']
@@ -41,7 +57,40 @@ def application_extend(application: FormsBackend):
                 path = request.path
                 data = request.get_json()
 
-                application.orm.add_log(user.id, user.role, method, path, data)
+                application.log_writer.put(user.id, user.role, method, path, data)
+
+    @application.app.before_first_request
+    def start_sweeper():
+        # first request happens in the worker process, after fork
+        application.sweeper.ensure_started()
+
+    @application.app.cli.command('sweep-submissions')
+    def sweep_submissions():
+        """Complete submissions whose time is over"""
+        from datetime import datetime, timedelta
+
+        config = application.app.config
+        now = datetime.utcnow() - timedelta(seconds=config['SUBMISSION_GRACE_PERIOD'])
+        click.echo('Completed {} submissions'.format(application.sweeper.sweep(now, config['SWEEPER_BATCH_SIZE'])))
+
+    @application.app.cli.command('rebuild-scores')
+    @click.argument('test_ids', nargs=-1, type=int)
+    def rebuild_scores(test_ids):
+        """Recalculate score aggregates and histograms of given (or all) tests, e.g. after bucket width change"""
+        # archived tests included, their histograms are still shown
+        for test_id in test_ids or sorted(application.orm.get_tests_versions() or {}):
+            rebuilt = application.orm.rebuild_scores(test_id)
+            click.echo('Test {}: {}'.format(test_id, 'failed' if rebuilt is None else f'{rebuilt} submissions'))
+
+    @application.app.cli.command('question-stats')
+    @click.argument('test_ids', nargs=-1, type=int)
+    def question_stats(test_ids):
+        """Recompute difficulty and discrimination of questions of given (or all) tests"""
+        from backend.core.analytics import compute_question_stats
+
+        for test_id in test_ids or [test.id for test in application.orm.get_tests() or []]:
+            computed = compute_question_stats(application, test_id)
+            click.echo('Test {}: {}'.format(test_id, 'failed' if computed is None else f'{computed} questions'))
 
     @application.app.errorhandler(422)
     def handle_error(err):
@@ -55,7 +104,7 @@ def application_extend(application: FormsBackend):
             for value in messages.values():
                 msg_list += value
 
-        res = jsonify({'message': msg_list})
+        res = json_response({'message': msg_list})
         if headers:
             return res, err.code, headers
         else:
@@ -0,0 +1,145 @@
+from typing import Optional
+
+import numpy as np
+
+from backend.core.backend_app import FormsBackend
+from backend.core.enums import QuestionType
+
+AUTO_GRADED_TYPES = (QuestionType.SINGLE_CHOICE.value, QuestionType.MULTIPLE_CHOICE.value)
+
+# bit for any option that is not in the key, so such answer never equals the key mask
+OTHER_OPTION_BIT = 63
+
+
+def parse_options(answer) -> [str]:
+    """
+    Normalized choice options from the key text (`a, c`) or from candidate's answer list (`['a', 'c']`)
+    """
+    if answer is None:
+        return []
+    if isinstance(answer, str):
+        answer = answer.split(',')
+
+    return [option.strip().lower() for option in answer if option is not None and option.strip()]
+
+
+def is_auto_graded(question) -> bool:
+    return question.question_type in AUTO_GRADED_TYPES and not question.manually_grading
+
+
+class AnswerKey(object):
+    """
+    Auto-graded questions of one test as arrays. Option `i` of the question key is bit `i` of its mask,
+    the answer is correct when its mask equals the key mask: exactly the key options are chosen
+    """
+
+    def __init__(self, questions):
+        questions = [question for question in questions
+                     if is_auto_graded(question) and parse_options(question.answer)]
+
+        self.question_ids = np.array([question.id for question in questions], dtype=np.int64)
+        self.points = np.array([question.points or 0 for question in questions], dtype=np.float64)
+
+        options = [list(dict.fromkeys(parse_options(question.answer)))[:OTHER_OPTION_BIT] for question in questions]
+        self.masks = np.array([(1 << len(question_options)) - 1 for question_options in options], dtype=np.uint64)
+
+        # (question position, option) pairs of the whole key, used to look up bits of candidates' options
+        self.option_questions = np.repeat(np.arange(len(options), dtype=np.int64), [len(o) for o in options])
+        self.option_labels = np.array([option for question_options in options for option in question_options],
+                                      dtype=str)
+        self.option_bits = np.concatenate([np.arange(len(o), dtype=np.uint64) for o in options]) \
+            if options else np.array([], dtype=np.uint64)
+
+        self._order = np.argsort(self.question_ids)
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def positions(self, question_ids: np.ndarray) -> np.ndarray:
+        """
+        :return: position of every question in the key, -1 for questions that are not auto-graded
+        """
+        if not len(self):
+            return np.full(len(question_ids), -1, dtype=np.int64)
+
+        sorted_ids = self.question_ids[self._order]
+        found = np.minimum(np.searchsorted(sorted_ids, question_ids), len(sorted_ids) - 1)
+
+        return np.where(sorted_ids[found] == question_ids, self._order[found], -1)
+
+    def encode(self, positions: np.ndarray, answers: [list]) -> np.ndarray:
+        """
+        Bitmasks of chosen options, one per answer row
+        :param positions: key positions of the rows' questions, all of them must be in the key
+        :param answers: candidate's options of every row
+        """
+        answers = [parse_options(answer) for answer in answers]
+        rows = np.repeat(np.arange(len(answers), dtype=np.int64), [len(answer) for answer in answers])
+        labels = np.array([option for answer in answers for option in answer], dtype=str)
+
+        # one code per distinct option text, then (question, option) pair is a single integer
+        uniques, codes = np.unique(np.concatenate([self.option_labels, labels]), return_inverse=True)
+        key_pairs = self.option_questions * len(uniques) + codes[:len(self.option_labels)]
+        answer_pairs = positions[rows] * len(uniques) + codes[len(self.option_labels):]
+
+        order = np.argsort(key_pairs)
+        bits = np.full(len(answer_pairs), OTHER_OPTION_BIT, dtype=np.uint64)
+        if len(key_pairs):
+            found = np.minimum(np.searchsorted(key_pairs[order], answer_pairs), len(key_pairs) - 1)
+            matched = key_pairs[order][found] == answer_pairs
+            bits[matched] = self.option_bits[order][found[matched]]
+
+        masks = np.zeros(len(answers), dtype=np.uint64)
+        np.bitwise_or.at(masks, rows, np.left_shift(np.uint64(1), bits))
+
+        return masks
+
+    def grade(self, positions: np.ndarray, masks: np.ndarray) -> np.ndarray:
+        return np.where(masks == self.masks[positions], self.points[positions], 0.0)
+
+    def grade_answers(self, question_ids: [int], answers: [list]) -> [Optional[float]]:
+        """
+        Grades a batch of answers as they arrive
+        :return: grade of every answer, None for questions that are not auto-graded
+        """
+        positions = self.positions(np.array(question_ids, dtype=np.int64))
+        graded = positions >= 0
+        if not graded.any():
+            return [None] * len(answers)
+
+        grades = np.full(len(positions), np.nan)
+        grades[graded] = self.grade(positions[graded],
+                                    self.encode(positions[graded], [a for a, g in zip(answers, graded) if g]))
+
+        return [None if np.isnan(grade) else float(grade) for grade in grades]
+
+
+def grade_test(application: FormsBackend, test_id: int) -> Optional[dict]:
+    """
+    Grades single and multiple choice answers of all completed submissions of the test in one pass,
+    manually graded questions are left untouched
+    :return: {'submissions': <graded submissions>, 'answers': <graded answers>} or None in case of error
+    """
+    questions = application.orm.get_answer_key(test_id)
+    if questions is None:
+        return None
+
+    key = AnswerKey(questions)
+    if not len(key):
+        return {'submissions': 0, 'answers': 0}
+
+    rows = application.orm.get_submitted_answers(test_id, key.question_ids.tolist())
+    if rows is None:
+        return None
+
+    submission_ids = np.array([row.submission_id for row in rows], dtype=np.int64)
+    question_ids = np.array([row.question_id for row in rows], dtype=np.int64)
+    positions = key.positions(question_ids)
+
+    grades = key.grade(positions, key.encode(positions, [row.answer for row in rows]))
+
+    saved = application.orm.save_grades(submission_ids.tolist(), question_ids.tolist(), grades.tolist())
+    if saved is None:
+        return None
+
+    return {'submissions': int(np.unique(submission_ids).size), 'answers': saved}
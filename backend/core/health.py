@@ -0,0 +1,101 @@
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from backend.core.backend_app import FormsBackend
+
+
+class ReadinessProbe(object):
+    """
+    Decides whether this worker should receive traffic.
+
+    The DB check goes through a separate pool-less engine with short connect and statement timeouts,
+    so it neither waits for a busy pool nor hangs on an unreachable server. Its result is cached for
+    `READINESS_CACHE_TTL` seconds to keep probe traffic away from Postgres.
+    """
+
+    def __init__(self, application: FormsBackend):
+        self.application = application
+        self.config = application.app.config
+
+        self._engine = None
+        self._lock = threading.Lock()
+        self._db_ok = None
+        self._db_error = None
+        self._checked_at = 0.0
+
+    def _get_engine(self):
+        if self._engine is None:
+            timeout = self.config['READINESS_DB_TIMEOUT']
+            self._engine = create_engine(
+                self.config['SQLALCHEMY_DATABASE_URI'],
+                poolclass=NullPool,
+                connect_args={
+                    'connect_timeout': max(1, int(timeout)),
+                    'options': '-c statement_timeout={}'.format(int(timeout * 1000)),
+                },
+            )
+
+        return self._engine
+
+    def check_db(self) -> (bool, str):
+        now = time.monotonic()
+        if now - self._checked_at < self.config['READINESS_CACHE_TTL']:
+            return self._db_ok, self._db_error
+
+        # only one thread probes, the others keep using the previous result
+        if not self._lock.acquire(blocking=False):
+            return self._db_ok, self._db_error
+
+        try:
+            with self._get_engine().connect() as connection:
+                connection.execute(text('SELECT 1'))
+
+            self._db_ok, self._db_error = True, None
+        except Exception as excpt:
+            # the probe is public, connection details stay in the log
+            print(f'Readiness database check failed: {str(excpt).strip()}')
+            self._db_ok, self._db_error = False, 'database unavailable'
+        finally:
+            self._checked_at = time.monotonic()
+            self._lock.release()
+
+        return self._db_ok, self._db_error
+
+    def pool_status(self) -> dict:
+        pool = self.application.db.engine.pool
+
+        size = pool.size()
+        capacity = size + max(getattr(pool, '_max_overflow', 0), 0)
+        checked_out = pool.checkedout()
+
+        return {
+            'size': size,
+            'checked_out': checked_out,
+            'overflow': pool.overflow(),
+            'saturation': round(checked_out / capacity, 3) if capacity else 0,
+        }
+
+    def status(self) -> (bool, dict):
+        db_ok, db_error = self.check_db()
+        pool = self.pool_status()
+        queue_depth = self.application.log_writer.depth()
+
+        reasons = []
+        if db_ok is False:
+            reasons.append('Database is unavailable')
+        if pool['saturation'] >= self.config['READINESS_MAX_POOL_SATURATION']:
+            reasons.append('Connection pool is saturated')
+        if queue_depth >= self.config['READINESS_MAX_QUEUE_DEPTH']:
+            reasons.append('Request log queue is overloaded')
+
+        data = {
+            'database': {'available': bool(db_ok), 'error': db_error},
+            'pool': pool,
+            'request_log_queue': queue_depth,
+            'reasons': reasons,
+        }
+
+        return len(reasons) == 0, data
@@ -0,0 +1,154 @@
+import csv
+import io
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Optional
+
+from validate_email import validate_email
+
+from backend.core.backend_app import FormsBackend
+from backend.core.enums import Gender
+
+IMPORT_COLUMNS = ('email', 'password', 'first_name', 'last_name', 'nationality', 'gender', 'date_of_birth',
+                  'subscription_email', 'skype', 'phone')
+REQUIRED_COLUMNS = ('email', 'password')
+
+GENDERS = {
+    'male': Gender.MALE.value, 'm': Gender.MALE.value,
+    'female': Gender.FEMALE.value, 'f': Gender.FEMALE.value,
+}
+
+
+class ImportFileError(ValueError):
+    """
+    The whole input is unreadable, e.g. broken CSV header
+    """
+
+
+def read_rows(data: bytes, data_format: str) -> [dict]:
+    """
+    Parses CSV with header or newline delimited JSON objects
+    """
+    text = data.decode('utf-8-sig')
+
+    if data_format == 'csv':
+        reader = csv.DictReader(io.StringIO(text))
+        if reader.fieldnames is None or not set(REQUIRED_COLUMNS) <= set(reader.fieldnames):
+            raise ImportFileError('CSV header must contain columns: ' + ', '.join(REQUIRED_COLUMNS))
+        return list(reader)
+
+    if data_format == 'ndjson':
+        rows = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            # broken line is reported as a row error, not as a broken file
+            rows.append(row if isinstance(row, dict) else {})
+        return rows
+
+    raise ImportFileError('Unknown import format, use csv or ndjson')
+
+
+def clean_row(row: dict) -> dict:
+    """
+    Validates and converts one input row
+    :raises ValueError: with the message for the row
+    """
+    values = {column: row.get(column) for column in IMPORT_COLUMNS}
+    for column, value in values.items():
+        # JSON objects and arrays would be stored as their python repr, credentials must be text
+        if isinstance(value, (dict, list)) or column in REQUIRED_COLUMNS and value is not None \
+                and not isinstance(value, str):
+            raise ValueError(f'{column} must be a string')
+
+    values = {column: value.strip() if isinstance(value, str) else value for column, value in values.items()}
+    values = {column: None if value == '' else value for column, value in values.items()}
+
+    for column in REQUIRED_COLUMNS:
+        if not values[column]:
+            raise ValueError(f'{column} is required')
+    if not validate_email(values['email']):
+        raise ValueError('Invalid email')
+
+    gender = values['gender']
+    if gender is not None and not isinstance(gender, bool):
+        if str(gender).lower() not in GENDERS:
+            raise ValueError('Invalid gender, use male or female')
+        values['gender'] = GENDERS[str(gender).lower()]
+
+    if values['date_of_birth'] is not None:
+        try:
+            values['date_of_birth'] = datetime.strptime(str(values['date_of_birth']), '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError('Invalid date_of_birth, use YYYY-MM-DD')
+
+    return values
+
+
+def _hash_password(password: str) -> str:
+    from passlib.hash import argon2
+
+    return argon2.hash(password)
+
+
+def hash_passwords(passwords: [str], processes: int) -> [str]:
+    """
+    Argon2 is deliberately slow, hashes are computed in parallel processes. `spawn` does not copy
+    the server process with its threads and connections
+    """
+    if processes <= 1 or len(passwords) < 2:
+        return [_hash_password(password) for password in passwords]
+
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return list(pool.map(_hash_password, passwords, chunksize=max(1, len(passwords) // (processes * 4))))
+
+
+def import_candidates(application: FormsBackend, data: bytes, data_format: str) -> Optional[dict]:
+    """
+    Creates candidates with all their profile parts. Invalid rows and already registered emails are reported
+    and skipped, the rest is created in one transaction
+    :return: {'created': <number>, 'errors': [{'row': <1-based row number>, 'email': ..., 'message': ...}]}
+        or None in case of database error
+    :raises ImportFileError: if the input can not be read at all
+    """
+    config = application.app.config
+
+    rows = read_rows(data, data_format)
+    if len(rows) > config['IMPORT_MAX_ROWS']:
+        raise ImportFileError('At most {} rows can be imported at once'.format(config['IMPORT_MAX_ROWS']))
+
+    errors = []
+    valid = []
+    emails = set()
+    for number, row in enumerate(rows, start=1):
+        try:
+            values = clean_row(row)
+            if values['email'] in emails:
+                raise ValueError('Duplicate email in the file')
+        except ValueError as excpt:
+            errors.append({'row': number, 'email': row.get('email'), 'message': str(excpt)})
+            continue
+
+        emails.add(values['email'])
+        valid.append((number, values))
+
+    passwords = hash_passwords([values['password'] for _, values in valid], config['IMPORT_HASH_PROCESSES'])
+    for (_, values), password in zip(valid, passwords):
+        values['password'] = password
+
+    existing = application.orm.import_candidates([{'row': number, **values} for number, values in valid])
+    if existing is None:
+        return None
+
+    existing = set(existing)
+    errors.extend({'row': number, 'email': values['email'], 'message': 'User with such email already exists'}
+                  for number, values in valid if number in existing)
+    errors.sort(key=lambda error: error['row'])
+
+    return {'created': len(valid) - len(existing), 'errors': errors}
@@ -0,0 +1,281 @@
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from backend.core.backend_app import FormsBackend
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = 'unmatched'
+
+
+class MetricsRegistry(object):
+    """
+    Per-process collector of request metrics.
+
+    Every worker keeps its own counters in memory and periodically dumps them into
+    `<directory>/metrics_<pid>.json`. Exposition merges the files of all workers, so the numbers
+    are correct no matter which worker handles the `/service/metrics` request.
+    """
+
+    def __init__(self, directory: str = None, flush_interval: float = 5.0, buckets=DEFAULT_BUCKETS):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'admission-forms-metrics')
+        self.flush_interval = flush_interval
+        self.buckets = tuple(sorted(buckets))
+
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._gauge_sources = {}
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._requests = defaultdict(int)
+        self._errors = defaultdict(int)
+        self._latency = {}
+        self._cache = defaultdict(int)
+
+    # ------------
+    # COLLECT
+    def observe_request(self, route: str, method: str, status: int, duration: float):
+        with self._lock:
+            self._check_pid()
+
+            self._requests[(route, method, str(status))] += 1
+            if status >= 400:
+                self._errors[(route, method, str(status))] += 1
+
+            key = (route, method)
+            histogram = self._latency.get(key)
+            if histogram is None:
+                histogram = self._latency[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += duration
+            histogram['count'] += 1
+
+    def cache_hit(self, cache: str):
+        self._observe_cache(cache, 'hit')
+
+    def cache_miss(self, cache: str):
+        self._observe_cache(cache, 'miss')
+
+    def _observe_cache(self, cache, result):
+        with self._lock:
+            self._check_pid()
+            self._cache[(cache, result)] += 1
+
+    def add_gauge_source(self, name: str, source):
+        """
+        Registers callable returning `{gauge_name: value}`; it is sampled on every flush
+        """
+        self._gauge_sources[name] = source
+
+    def _check_pid(self):
+        # counters inherited through fork belong to the parent, the child starts from scratch
+        if self._pid != os.getpid():
+            self._reset()
+
+    # ------------
+    # STORAGE
+    def _own_file(self):
+        return os.path.join(self.directory, 'metrics_{}.json'.format(os.getpid()))
+
+    def _snapshot(self) -> dict:
+        gauges = {}
+        for source in self._gauge_sources.values():
+            try:
+                gauges.update(source())
+            except Exception as excpt:
+                print(f'Could not sample gauges: {excpt}')
+
+        with self._lock:
+            self._check_pid()
+
+            return {
+                'pid': self._pid,
+                'requests': [[*key, value] for key, value in self._requests.items()],
+                'errors': [[*key, value] for key, value in self._errors.items()],
+                'latency': [[*key, value] for key, value in self._latency.items()],
+                'cache': [[*key, value] for key, value in self._cache.items()],
+                'gauges': gauges,
+            }
+
+    def flush(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = now
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+
+            path = self._own_file()
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._snapshot(), f)
+            os.replace(tmp_path, path)
+        except OSError as excpt:
+            print(f'Could not flush metrics: {excpt}')
+
+    def clear_directory(self):
+        """
+        Removes files left by the previous run. Should be called once by the master process
+        """
+        for path in glob.glob(os.path.join(self.directory, 'metrics_*.json')):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _load_all(self) -> [dict]:
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, 'metrics_*.json')):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                # file of a worker that is being written right now or got corrupted
+                continue
+
+        return snapshots
+
+    # ------------
+    # EXPOSITION
+    def render(self) -> str:
+        """
+        Returns metrics of all workers in Prometheus text format
+        """
+        self.flush(force=True)
+
+        requests = defaultdict(int)
+        errors = defaultdict(int)
+        cache = defaultdict(int)
+        latency = {}
+        gauges = []
+
+        for snapshot in self._load_all():
+            for route, method, status, value in snapshot['requests']:
+                requests[(route, method, status)] += value
+            for route, method, status, value in snapshot['errors']:
+                errors[(route, method, status)] += value
+            for name, result, value in snapshot['cache']:
+                cache[(name, result)] += value
+            for route, method, histogram in snapshot['latency']:
+                merged = latency.setdefault((route, method), {'buckets': [0] * len(self.buckets),
+                                                              'sum': 0.0, 'count': 0})
+                for i, value in enumerate(histogram['buckets'][:len(self.buckets)]):
+                    merged['buckets'][i] += value
+                merged['sum'] += histogram['sum']
+                merged['count'] += histogram['count']
+
+            if _is_alive(snapshot['pid']):
+                for name, value in snapshot['gauges'].items():
+                    gauges.append((name, snapshot['pid'], value))
+
+        lines = []
+
+        lines += ['# HELP http_requests_total Handled requests per resource',
+                  '# TYPE http_requests_total counter']
+        for (route, method, status), value in sorted(requests.items()):
+            lines.append(_sample('http_requests_total', value, route=route, method=method, status=status))
+
+        lines += ['# HELP http_request_errors_total Requests finished with 4xx/5xx status per resource',
+                  '# TYPE http_request_errors_total counter']
+        for (route, method, status), value in sorted(errors.items()):
+            lines.append(_sample('http_request_errors_total', value, route=route, method=method, status=status))
+
+        lines += ['# HELP http_request_duration_seconds Request latency per resource',
+                  '# TYPE http_request_duration_seconds histogram']
+        for (route, method), histogram in sorted(latency.items()):
+            for bound, value in zip(self.buckets, histogram['buckets']):
+                lines.append(_sample('http_request_duration_seconds_bucket', value,
+                                     route=route, method=method, le=repr(float(bound))))
+            lines.append(_sample('http_request_duration_seconds_bucket', histogram['count'],
+                                 route=route, method=method, le='+Inf'))
+            lines.append(_sample('http_request_duration_seconds_sum', histogram['sum'], route=route, method=method))
+            lines.append(_sample('http_request_duration_seconds_count', histogram['count'],
+                                 route=route, method=method))
+
+        lines += ['# HELP cache_requests_total Cache lookups by result',
+                  '# TYPE cache_requests_total counter']
+        for (name, result), value in sorted(cache.items()):
+            lines.append(_sample('cache_requests_total', value, cache=name, result=result))
+
+        lines += ['# HELP cache_hit_ratio Share of cache lookups served from cache',
+                  '# TYPE cache_hit_ratio gauge']
+        for name in sorted({name for name, _ in cache}):
+            total = cache[(name, 'hit')] + cache[(name, 'miss')]
+            lines.append(_sample('cache_hit_ratio', cache[(name, 'hit')] / total if total else 0, cache=name))
+
+        for name in sorted({name for name, _, _ in gauges}):
+            lines.append('# TYPE {} gauge'.format(name))
+            for g_name, pid, value in gauges:
+                if g_name == name:
+                    lines.append(_sample(name, value, pid=str(pid)))
+
+        return '\n'.join(lines) + '\n'
+
+
+def _sample(name, value, **labels):
+    label_str = ','.join('{}="{}"'.format(key, _escape(val)) for key, val in labels.items())
+
+    return '{}{{{}}} {}'.format(name, label_str, value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _is_alive(pid):
+    if pid == os.getpid():
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+def application_add_metrics(application: FormsBackend):
+    """
+    Registers request hooks that feed the metrics registry
+    """
+    from flask import g, request
+
+    metrics = application.metrics = MetricsRegistry(directory=application.app.config.get('METRICS_DIR'),
+                                                     flush_interval=application.app.config['METRICS_FLUSH_INTERVAL'])
+
+    def pool_gauges():
+        pool = application.db.engine.pool
+
+        return {
+            'db_pool_size': pool.size(),
+            'db_pool_checked_out': pool.checkedout(),
+            'db_pool_overflow': pool.overflow(),
+        }
+
+    metrics.add_gauge_source('db_pool', pool_gauges)
+
+    @application.app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @application.app.after_request
+    def observe_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route = application.route_names.get(request.endpoint, UNMATCHED_ROUTE)
+            metrics.observe_request(route, request.method, response.status_code, time.perf_counter() - start)
+            metrics.flush()
+
+        return response
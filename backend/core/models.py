@@ -1,17 +1,35 @@
-from datetime import datetime
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
 from typing import List, Optional
 
 from flask_jwt_extended import decode_token
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Date, Boolean, Text, BigInteger, ForeignKey, Numeric, ARRAY, Integer, String, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Date, Boolean, Text, BigInteger, ForeignKey, Numeric, ARRAY, Integer, String, DateTime, \
+    Float, text
+from sqlalchemy import inspect
+from sqlalchemy.orm import relationship, selectinload, joinedload, load_only
 
+from backend.core.cache import TESTS_CHANNEL
 from backend.core.enums import UsersRole, CandidateStatus, TokenType
+from backend.core.importer import IMPORT_COLUMNS
 from backend.helpers import _epoch_utc_to_datetime
 from server import application
 
 db = application.db
 
+# adds `delta` submissions to histogram buckets listed in the `moves` CTE: (test_id, bucket, delta)
+HISTOGRAM_UPSERT = """
+    INSERT INTO tests_score_histogram (test_id, bucket, submissions)
+    SELECT test_id, bucket, sum(delta) FROM moves
+    GROUP BY test_id, bucket
+    HAVING sum(delta) <> 0
+    ON CONFLICT (test_id, bucket) DO UPDATE
+        SET submissions = tests_score_histogram.submissions + excluded.submissions
+"""
+HISTOGRAM_BUCKET = "CAST(floor(coalesce(score, 0) / :bucket_size) AS integer)"
+
 
 class TokenBlacklist(db.Model):
     """
@@ -40,6 +58,8 @@ class Users(db.Model):
     first_name = Column(Text)
     last_name = Column(Text)
     role = Column(BigInteger)
+    # incremented on every change of the profile, used as ETag
+    version = Column(BigInteger, default=1, server_default='1', nullable=False)
 
     autorization = relationship('UsersAutorization', cascade="all,delete", backref='user',
                                 uselist=False)  # one-to-one
@@ -150,6 +170,8 @@ class Tests(db.Model):
     test_name = Column(Text)
     max_time = Column(Integer)
     archived = Column(Boolean)
+    # incremented on every change of the test or its questions, identifies cached payloads
+    version = Column(BigInteger, default=1, server_default='1', nullable=False)
 
     questions_tests = relationship('QuestionsTests', cascade="all,delete", backref='tests',
                                    uselist=True)  # one-to-one
@@ -167,9 +189,16 @@ class TestsSubmissions(db.Model):
     id = Column(BigInteger, primary_key=True)
     candidate_id = Column(BigInteger, ForeignKey(Users.id))
     test_id = Column(Integer, ForeignKey(Tests.id))
-    time_start = Column(Date, default=datetime.utcnow)
-    time_end = Column(Date)
+    time_start = Column(DateTime, default=datetime.utcnow)
+    time_end = Column(DateTime)
+    # time_start + test max_time, after it no answers are accepted
+    deadline = Column(DateTime)
     submitted = Column(Boolean)
+    # sum of answers grades, kept up to date by checkpoints and grading
+    score = Column(Numeric, default=0, server_default='0')
+    # answers with grade and answers waiting for manual grading
+    graded_count = Column(Integer, default=0, server_default='0', nullable=False)
+    pending_count = Column(Integer, default=0, server_default='0', nullable=False)
     graded_by = (BigInteger, ForeignKey(Users.id))
 
     answers = relationship('CandidatesAnswers', cascade="all,delete", backref='questions_tests',
@@ -209,6 +238,9 @@ class CandidatesAnswers(db.Model):
     answer = Column(ARRAY(Text))
     grade = Column(Numeric)
     comments = Column(Text)
+    # manual grading lease, the answer is reserved for the grader until `claimed_until`
+    claimed_by = Column(BigInteger)
+    claimed_until = Column(DateTime)
 
 
 class QuestionsTests(db.Model):
@@ -222,6 +254,36 @@ class QuestionsTests(db.Model):
     test_id = Column(BigInteger, ForeignKey(Tests.id))
 
 
+class TestsScoreHistogram(db.Model):
+    """
+    Number of completed submissions of the test per score bucket, maintained together with the scores
+    """
+    __tablename__ = 'tests_score_histogram'
+    __table_args__ = {'extend_existing': True}
+
+    test_id = Column(BigInteger, ForeignKey(Tests.id, ondelete='CASCADE'), primary_key=True)
+    # scores from bucket * SCORE_HISTOGRAM_BUCKET, inclusive, to (bucket + 1) * SCORE_HISTOGRAM_BUCKET
+    bucket = Column(Integer, primary_key=True)
+    submissions = Column(Integer, nullable=False, default=0)
+
+
+class QuestionStats(db.Model):
+    """
+    Item analysis of the question over graded answers of completed submissions, see `analytics.py`
+    """
+    __tablename__ = 'question_stats'
+    __table_args__ = {'extend_existing': True}
+
+    question_id = Column(BigInteger, ForeignKey(Questions.id, ondelete='CASCADE'), primary_key=True)
+    test_id = Column(BigInteger, ForeignKey(Tests.id, ondelete='CASCADE'), index=True)
+    answers = Column(Integer, nullable=False)
+    # mean share of question points earned
+    difficulty = Column(Float)
+    # correlation of the question score with the rest of the test score
+    discrimination = Column(Float)
+    computed_at = Column(DateTime, nullable=False)
+
+
 class RequestLog(db.Model):
     """
     Linking table between tests and questions
@@ -337,9 +399,10 @@ class ORM:
         :return: id of the given candidate or None in case of error
         """
         try:
-            candidates_info = CandidatesInfo(id=candidate_id, nationaity=nationality,
+            candidates_info = CandidatesInfo(id=candidate_id, nationality=nationality,
                                              gender=gender, date_of_birth=date_of_birth)
             self.session.add(candidates_info)
+            self._touch_user(candidate_id)
             self.session.commit()
 
             return candidates_info
@@ -353,9 +416,13 @@ class ORM:
                               status: int = CandidateStatus.PENDING,
                               admission_date: Date = None) -> Optional[CandidatesStatus]:
         try:
-            candidates_status = CandidatesStatus(candidate_id=candidate_id, status=status,
+            if isinstance(status, CandidateStatus):
+                status = status.value
+
+            candidates_status = CandidatesStatus(id=candidate_id, status=status,
                                                  admission_date=admission_date)
             self.session.add(candidates_status)
+            self._touch_user(candidate_id)
             self.session.commit()
 
             return candidates_status
@@ -405,6 +472,7 @@ class ORM:
                                                        photo=photo, project_description=project_description,
                                                        transcript=transcript)
             self.session.add(candidates_documents)
+            self._touch_user(u_id)
             self.session.commit()
 
             return candidates_documents
@@ -414,6 +482,84 @@ class ORM:
 
         return None
 
+    def import_candidates(self, rows: [dict]) -> Optional[List[int]]:
+        """
+        Creates candidates with authorization, info, documents and status in one transaction.
+        Rows are staged with COPY and copied to the tables with set-based INSERTs
+        :param rows: dicts with `row` number, `importer.IMPORT_COLUMNS` and hashed `password`
+        :return: numbers of rows skipped because the email is already registered, or None in case of error
+        """
+        if not rows:
+            return []
+
+        columns = ('row', ) + IMPORT_COLUMNS
+        staged_columns = ('row_no', ) + IMPORT_COLUMNS
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(['' if row[column] is None else
+                             str(row[column]).lower() if isinstance(row[column], bool) else
+                             row[column].isoformat() if isinstance(row[column], date) else row[column]
+                             for column in columns])
+        buffer.seek(0)
+
+        try:
+            self.session.execute(text("""
+                CREATE TEMPORARY TABLE import_candidates (
+                    row_no integer, email text, password text, first_name text, last_name text, nationality text,
+                    gender boolean, date_of_birth date, subscription_email text, skype text, phone text,
+                    user_id bigint
+                ) ON COMMIT DROP
+            """))
+            cursor = self.session.connection().connection.cursor()
+            cursor.copy_expert('COPY import_candidates ({}) FROM STDIN WITH (FORMAT csv)'.format(
+                ', '.join(staged_columns)), buffer)
+
+            self.session.execute(text("""
+                UPDATE import_candidates SET user_id = nextval(pg_get_serial_sequence('users', 'id'))
+            """))
+            self.session.execute(text("""
+                INSERT INTO users (id, first_name, last_name, role)
+                SELECT user_id, first_name, last_name, :role FROM import_candidates
+            """), {'role': UsersRole.CANDIDATE.value})
+            # emails registered meanwhile are skipped instead of failing the whole batch
+            created = self.session.execute(text("""
+                INSERT INTO candidates_autorization (email, id, password)
+                SELECT email, user_id, password FROM import_candidates
+                ON CONFLICT (email) DO NOTHING
+                RETURNING id
+            """)).fetchall()
+            existing = self.session.execute(text("""
+                WITH skipped AS (
+                    DELETE FROM import_candidates
+                    WHERE user_id <> ALL(CAST(:created AS bigint[]))
+                    RETURNING row_no, user_id
+                ), removed AS (
+                    DELETE FROM users WHERE id IN (SELECT user_id FROM skipped)
+                )
+                SELECT row_no FROM skipped
+            """), {'created': [row.id for row in created]}).fetchall()
+
+            self.session.execute(text("""
+                INSERT INTO candidates_info (id, nationality, gender, date_of_birth, subscription_email, skype, phone)
+                SELECT user_id, nationality, gender, date_of_birth, subscription_email, skype, phone
+                FROM import_candidates
+            """))
+            self.session.execute(text("""
+                INSERT INTO candidates_documents (id) SELECT user_id FROM import_candidates
+            """))
+            self.session.execute(text("""
+                INSERT INTO candidates_status (id, status) SELECT user_id, :status FROM import_candidates
+            """), {'status': CandidateStatus.PENDING.value})
+            self.session.commit()
+
+            return [row.row_no for row in existing]
+        except Exception as excpt:
+            self.session.rollback()
+            print(f'Couldn\'t import candidates: {excpt}')
+
+        return None
+
     # tests adding
     def update_question(self, question: str, question_type: int, answer: [str],
                         manually_grading: bool, points: float,
@@ -431,13 +577,15 @@ class ORM:
         """
         try:
 
-            new_question = self.session.query(Questions) \
+            self.session.query(Questions) \
                 .filter(Questions.id == question_id) \
                 .update({'question': question, 'question_type': question_type, 'answer': answer,
                          'manually_grading': manually_grading,
-                         'points': points, 'test_id': test_id, })
-            self.session.flush()
-            return new_question.id
+                         'points': points, })
+            self._touch_test(test_id)
+            self.session.commit()
+            self._test_changed(test_id)
+            return question_id
         except Exception as excpt:
             self.session.rollback()
             print(f'Couldn\'t add question: {excpt}')
@@ -463,7 +611,9 @@ class ORM:
             self.session.commit()
             new_questions_tests = QuestionsTests(question_id=new_question.id, test_id=test_id)
             self.session.add(new_questions_tests)
+            self._touch_test(test_id)
             self.session.commit()
+            self._test_changed(test_id)
             return new_question.id
         except Exception as excpt:
             self.session.rollback()
@@ -505,6 +655,130 @@ class ORM:
 
         return None
 
+    def claim_answers(self, grader_id: int, count: int, lease: int, test_id: int = None) -> Optional[list]:
+        """
+        Reserves up to `count` ungraded answers to manually graded questions of completed submissions
+        for the grader. Rows being claimed by other graders are skipped instead of waited for, answers
+        with an active lease are not offered
+        :param lease: seconds the answers stay reserved
+        :param test_id: claim answers of this test only
+        :return: (submission_id, question_id, answer, question, points, claimed_until) of claimed answers
+        """
+        now = datetime.utcnow()
+        try:
+            result = self.session.execute(text("""
+                WITH candidates AS (
+                    SELECT a.submission_id, a.question_id
+                    FROM candidates_answers a
+                    JOIN candidates_submissions s ON s.id = a.submission_id
+                    JOIN questions q ON q.id = a.question_id
+                    WHERE a.grade IS NULL
+                      AND q.manually_grading IS TRUE
+                      AND (a.claimed_until IS NULL OR a.claimed_until < :now)
+                      AND s.submitted IS TRUE
+                      AND (CAST(:test_id AS bigint) IS NULL OR s.test_id = :test_id)
+                    ORDER BY a.submission_id, a.question_id
+                    LIMIT :count
+                    FOR UPDATE OF a SKIP LOCKED
+                ), claimed AS (
+                    UPDATE candidates_answers a
+                    SET claimed_by = :grader_id, claimed_until = :claimed_until
+                    FROM candidates c
+                    WHERE a.submission_id = c.submission_id AND a.question_id = c.question_id
+                    RETURNING a.submission_id, a.question_id, a.answer, a.claimed_until
+                )
+                SELECT c.submission_id, c.question_id, c.answer, q.question, q.points, c.claimed_until
+                FROM claimed c
+                JOIN questions q ON q.id = c.question_id
+                ORDER BY c.submission_id, c.question_id
+            """), {'grader_id': grader_id, 'count': count, 'test_id': test_id, 'now': now,
+                   'claimed_until': now + timedelta(seconds=lease)})
+            claimed = result.fetchall()
+            self.session.commit()
+
+            return claimed
+        except Exception as excpt:
+            self.session.rollback()
+            print(f'Couldn\'t claim answers: {excpt}')
+
+        return None
+
+    def stream_graded_answers(self, test_id: int, chunk_size: int):
+        """
+        Yields lists of (question_id, grade, score) of graded answers of completed submissions of the test.
+        Rows come from a server-side cursor, at most `chunk_size` of them are in memory at once.
+        Errors are raised to the caller
+        """
+        result = self.session.connection().execution_options(stream_results=True).execute(text("""
+            SELECT a.question_id, a.grade, s.score
+            FROM candidates_answers a
+            JOIN candidates_submissions s ON s.id = a.submission_id
+            WHERE s.test_id = :test_id AND s.submitted IS TRUE AND a.grade IS NOT NULL
+        """), {'test_id': test_id})
+        try:
+            while True:
+                rows = result.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            result.close()
+
+    def stream_test_export(self, test_id: int, chunk_size: int):
+        """
+        Yields lists of rows with submission, candidate and answer columns (see `export.EXPORT_COLUMNS`)
+        for all answers of the test, through a server-side cursor. Errors are raised to the caller
+        """
+        result = self.session.connection().execution_options(stream_results=True).execute(text("""
+            SELECT s.id AS submission_id, s.candidate_id, u.first_name, u.last_name, s.time_start, s.time_end,
+                   s.submitted, s.score, a.question_id, a.answer, a.grade, a.comments
+            FROM candidates_submissions s
+            JOIN users u ON u.id = s.candidate_id
+            JOIN candidates_answers a ON a.submission_id = s.id
+            WHERE s.test_id = :test_id
+            ORDER BY s.id, a.question_id
+        """), {'test_id': test_id})
+        try:
+            while True:
+                rows = result.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            result.close()
+
+    def get_answer_key(self, test_id: int) -> Optional[list]:
+        """
+        :return: (id, question_type, answer, points, manually_grading) of every question of the test
+        """
+        try:
+            return self.session.query(Questions.id, Questions.question_type, Questions.answer, Questions.points,
+                                      Questions.manually_grading) \
+                .join(QuestionsTests, QuestionsTests.question_id == Questions.id) \
+                .filter(QuestionsTests.test_id == test_id).all()
+        except Exception as excpt:
+            self.session.rollback()
+            print(f'Couldn\'t get answer key: {excpt}')
+
+        return None
+
+    def get_submitted_answers(self, test_id: int, question_ids: [int]) -> Optional[list]:
+        """
+        :return: (submission_id, question_id, answer) for given questions of all completed submissions of the test
+        """
+        try:
+            return self.session.query(CandidatesAnswers.submission_id, CandidatesAnswers.question_id,
+                                      CandidatesAnswers.answer) \
+                .join(TestsSubmissions, TestsSubmissions.id == CandidatesAnswers.submission_id) \
+                .filter(TestsSubmissions.test_id == test_id) \
+                .filter(TestsSubmissions.submitted.is_(True)) \
+                .filter(CandidatesAnswers.question_id.in_(question_ids)).all()
+        except Exception as excpt:
+            self.session.rollback()
+            print(f'Couldn\'t get answers: {excpt}')
+
+        return None
+
     def is_answer_exists(self, submission_id, question_id) -> Optional[bool]:
         try:
             answer = self.session.query(CandidatesAnswers) \
@@ -518,6 +792,71 @@ class ORM:
 
         return False
 
+    def save_answers(self, submission_id: int, answers: [dict], now: datetime = None) -> Optional[int]:
+        """
+        Inserts or updates candidate's answers and keeps the submission score up to date. Answers are written
+        only while the submission is not completed and its deadline has not passed
+        :param submission_id: id of the submission
+        :param answers: list of {'question_id': int, 'answer': [str], 'grade': float or None}
+        :param now: current UTC time
+        :return: number of saved answers (0 if submission is closed) or None in case of error
+        """
+        if not answers:
+            return 0
+
+        try:
+            # checkpoints of one submission are serialized by the row lock, so the statement below
+            # sees grades committed by the previous one and the score delta is exact
+            locked = self.session.execute(text("""
+                SELECT id FROM candidates_submissions
+                WHERE id = :submission_id
+                  AND submitted IS NOT TRUE
+                  AND (deadline IS NULL OR deadline > :now)
+                FOR UPDATE
+            """), {'submission_id': submission_id, 'now': now or datetime.utcnow()}).first()
+            if locked is None:
+                self.session.commit()
+                return 0
+
+            result = self.session.execute(text("""
+                WITH new AS (
+                    SELECT * FROM json_to_recordset(CAST(:answers AS json))
+                        AS a(question_id bigint, answer text[], grade numeric)
+                ), old AS (
+                    SELECT a.question_id, a.grade FROM candidates_answers a
+                    WHERE a.submission_id = :submission_id AND a.question_id IN (SELECT question_id FROM new)
+                ), saved AS (
+                    INSERT INTO candidates_answers (submission_id, question_id, answer, grade)
+                    SELECT :submission_id, question_id, answer, grade FROM new
+                    ON CONFLICT (submission_id, question_id) DO UPDATE
+                        SET answer = excluded.answer, grade = excluded.grade
+                    RETURNING question_id, grade
+                ), scored AS (
+                    UPDATE candidates_submissions
+                    SET score = coalesce(score, 0)
+                            + coalesce((SELECT sum(grade) FROM saved), 0)
+                            - coalesce((SELECT sum(grade) FROM old), 0),
+                        graded_count = graded_count
+                            + (SELECT count(grade) FROM saved) - (SELECT count(grade) FROM old),
+                        pending_count = pending_count
+                            + (SELECT count(*) FROM saved s JOIN questions q ON q.id = s.question_id
+                               WHERE s.grade IS NULL AND q.manually_grading IS TRUE)
+                            - (SELECT count(*) FROM old o JOIN questions q ON q.id = o.question_id
+                               WHERE o.grade IS NULL AND q.manually_grading IS TRUE)
+                    WHERE id = :submission_id
+                )
+                SELECT count(*) FROM saved
+            """), {'submission_id': submission_id, 'answers': json.dumps(answers)})
+            saved = result.scalar()
+            self.session.commit()
+
+            return saved
+        except Exception as excpt:
+            self.session.rollback()
+            print(f'Couldn\'t save answers: {excpt}')
+
+        return None
+
     def update_answer(self, submission_id: int, question_id: int,
                       answer: str, grade: int, comments: str) -> Optional[int]:
         try:
@@ -525,7 +864,7 @@ class ORM:
                 .filter(CandidatesAnswers.submission_id == submission_id).filter(
                 CandidatesAnswers.question_id == question_id) \
                 .update({'answer': answer, 'grade': grade, 'comments': comments})
-            self.session.flush()
+            self._refresh_scores([submission_id])
             self.session.commit()
             return submission_id
         except Exception as excpt:
@@ -533,21 +872,162 @@ class ORM:
             print(f'Couldn\'t change test: {excpt}')
         return None
 
+    def _refresh_scores(self, submission_ids: [int]):
+        """
+        Recalculates score aggregates of given submissions and moves completed ones between histogram buckets,
+        in the current transaction
+        """
+        # the same order in every transaction, so concurrent refreshes do not deadlock
+        self.session.execute(text("""
+            SELECT id FROM candidates_submissions WHERE id = ANY(CAST(:submission_ids AS bigint[]))
+            ORDER BY id FOR UPDATE
+        """), {'submission_ids': submission_ids})
+
+        self.session.execute(text(f"""
+            WITH totals AS (
+                SELECT ids.id, coalesce(sum(a.grade), 0) AS score, count(a.grade) AS graded_count,
+                       count(*) FILTER (WHERE a.grade IS NULL AND q.manually_grading IS TRUE) AS pending_count
+                FROM unnest(CAST(:submission_ids AS bigint[])) AS ids(id)
+                LEFT JOIN candidates_answers a ON a.submission_id = ids.id
+                LEFT JOIN questions q ON q.id = a.question_id
+                GROUP BY ids.id
+            ), old AS (
+                SELECT s.test_id, s.score FROM candidates_submissions s
+                WHERE s.id = ANY(CAST(:submission_ids AS bigint[])) AND s.submitted IS TRUE
+            ), updated AS (
+                UPDATE candidates_submissions s
+                SET score = t.score, graded_count = t.graded_count, pending_count = t.pending_count
+                FROM totals t
+                WHERE s.id = t.id
+                RETURNING s.test_id, s.score, s.submitted
+            ), moves AS (
+                SELECT test_id, {HISTOGRAM_BUCKET} AS bucket, -1 AS delta FROM old
+                UNION ALL
+                SELECT test_id, {HISTOGRAM_BUCKET} AS bucket, 1 AS delta FROM updated WHERE submitted IS TRUE
+            ), histogram AS ({HISTOGRAM_UPSERT})
+            SELECT count(*) FROM updated
+        """), {'submission_ids': submission_ids, 'bucket_size': self._histogram_bucket()})
+
+    @staticmethod
+    def _histogram_bucket():
+        return application.app.config['SCORE_HISTOGRAM_BUCKET']
+
+    def submit_claimed_grades(self, grader_id: int, grades: [dict]) -> Optional[List[tuple]]:
+        """
+        Saves grades of answers claimed by the grader and releases them. Grades of answers claimed by
+        somebody else in the meantime or above the question points are not saved; an expired lease is fine
+        while nobody took the answer
+        :param grades: list of {'submission_id': int, 'question_id': int, 'grade': float, 'comments': str}
+        :return: (submission_id, question_id) of saved grades or None in case of error
+        """
+        if not grades:
+            return []
+
+        try:
+            result = self.session.execute(text("""
+                UPDATE candidates_answers a
+                SET grade = g.grade, comments = coalesce(g.comments, a.comments),
+                    claimed_by = NULL, claimed_until = NULL
+                FROM json_to_recordset(CAST(:grades AS json))
+                    AS g(submission_id bigint, question_id bigint, grade numeric, comments text),
+                    questions q
+                WHERE a.submission_id = g.submission_id AND a.question_id = g.question_id
+                  AND a.claimed_by = :grader_id
+                  AND q.id = a.question_id AND g.grade <= coalesce(q.points, 0)
+                RETURNING a.submission_id, a.question_id
+            """), {'grader_id': grader_id, 'grades': json.dumps(grades)})
+            saved = [(row.submission_id, row.question_id) for row in result]
+
+            if saved:
+                self._refresh_scores(sorted({submission_id for submission_id, _ in saved}))
+            self.session.commit()
+
+            return saved
+        except Exception as excpt:
+            self.session.rollback()
+            print(f'Couldn\'t save grades: {excpt}')
+
+        return None
+
+    def save_question_stats(self, test_id: int, question_ids: [int], answers: [int],
+                            difficulty: [Optional[float]], discrimination: [Optional[float]]) -> Optional[int]:
+        """
+        Replaces statistics of the test questions, lists are parallel
+        :return: number of saved rows or None in case of error
+        """
+        try:
+            self.session.query(QuestionStats).filter(QuestionStats.test_id == test_id) \
+                .delete(synchronize_session=False)
+            result = self.session.execute(text("""
+                INSERT INTO question_stats (question_id, test_id, answers, difficulty, discrimination, computed_at)
+                SELECT question_id, :test_id, answers, difficulty, discrimination, :now
+                FROM unnest(CAST(:question_ids AS bigint[]), CAST(:answers AS integer[]),
+                            CAST(:difficulty AS double precision[]), CAST(:discrimination AS double precision[]))
+                    AS s(question_id, answers, difficulty, discrimination)
+                ON CONFLICT (question_id) DO UPDATE
+                    SET test_id = excluded.test_id, answers = excluded.answers, difficulty = excluded.difficulty,
+                        discrimination = excluded.discrimination, computed_at = excluded.computed_at
+            """), {'test_id': test_id, 'question_ids': question_ids, 'answers': answers, 'difficulty': difficulty,
+                   'discrimination': discrimination, 'now': datetime.utcnow()})
+            self.session.commit()
+
+            return result.rowcount
+        except Exception as excpt:
+            self.session.rollback()
+            print(f'Couldn\'t save question stats: {excpt}')
+
+        return None
+
+    def save_grades(self, submission_ids: [int], question_ids: [int], grades: [float]) -> Optional[int]:
+        """
+        Sets grades of many answers with a single statement, lists are parallel
+        :return: number of updated answers or None in case of error
+        """
+        if not submission_ids:
+            return 0
+
+        try:
+            result = self.session.execute(text("""
+                UPDATE candidates_answers AS a
+                SET grade = g.grade
+                FROM unnest(CAST(:submission_ids AS bigint[]), CAST(:question_ids AS bigint[]),
+                            CAST(:grades AS numeric[])) AS g(submission_id, question_id, grade)
+                WHERE a.submission_id = g.submission_id AND a.question_id = g.question_id
+            """), {'submission_ids': submission_ids, 'question_ids': question_ids, 'grades': grades})
+            self._refresh_scores(list(set(submission_ids)))
+            self.session.commit()
+
+            return result.rowcount
+        except Exception as excpt:
+            self.session.rollback()
+            print(f'Couldn\'t save grades: {excpt}')
+
+        return None
+
     def add_test(self, test_name: str, max_time: int, archived: bool = False) -> Optional[int]:
         try:
             new_test = Tests(test_name=test_name, max_time=max_time, archived=archived)
             self.session.add(new_test)
+            self.session.flush()
+            self._notify_test_changed(new_test.id)
             self.session.commit()
+            self._test_changed(new_test.id)
             return new_test.id
         except Exception as excpt:
             self.session.rollback()
             print(f'Couldn\'t add test: {excpt}')
         return None
 
-    def init_submission(self, candidate_id: BigInteger, test_id: BigInteger):
+    def init_submission(self, candidate_id: BigInteger, test_id: BigInteger, max_time: int = None):
+        """
+        Starts the test for candidate
+        :param max_time: test duration in minutes, the submission has no deadline if it is not set
+        """
         try:
+            time_start = datetime.utcnow()
+            deadline = time_start + timedelta(minutes=max_time) if max_time else None
             new_submission = TestsSubmissions(candidate_id=candidate_id,
-                                              time_start=datetime.utcnow(), submitted=False,
+                                              time_start=time_start, deadline=deadline, submitted=False,
                                               test_id=test_id)
 
             self.session.add(new_submission)
@@ -573,17 +1053,78 @@ class ORM:
             print(f'Couldn\'t change test: {excpt}')
         return None
 
-    def finish_submission(self, submission_id: int):
+    def finish_submission(self, submission_id: int) -> Optional[tuple]:
+        """
+        Completes running submission
+        :return: (True, score graded on checkpoints), (False, None) if the submission is already completed
+            (e.g. by the sweeper or another worker) or None in case of error
+        """
         try:
-            self.session.query(TestsSubmissions) \
-                .filter(TestsSubmissions.id == submission_id) \
-                .update({'time_end': datetime.utcnow(), 'submitted': True})
-            self.session.flush()
+            row = self.session.execute(text(f"""
+                WITH done AS (
+                    UPDATE candidates_submissions
+                    SET time_end = :now, submitted = TRUE
+                    WHERE id = :submission_id AND submitted IS NOT TRUE
+                    RETURNING test_id, coalesce(score, 0) AS score
+                ), moves AS (
+                    SELECT test_id, {HISTOGRAM_BUCKET} AS bucket, 1 AS delta FROM done
+                ), histogram AS ({HISTOGRAM_UPSERT})
+                SELECT score FROM done
+            """), {'submission_id': submission_id, 'now': datetime.utcnow(),
+                   'bucket_size': self._histogram_bucket()}).first()
             self.session.commit()
-            return submission_id
+
+            return (True, row.score) if row is not None else (False, None)
         except Exception as excpt:
             self.session.rollback()
-            print(f'Couldn\'t add test: {excpt}')
+            print(f'Couldn\'t finish submission: {excpt}')
+
+        return None
+
+    def get_submission_deadline(self, submission_id: int) -> Optional[tuple]:
+        """
+        :return: (deadline, submitted, test_id) or None if there is no such submission
+        """
+        try:
+            return self.session.query(TestsSubmissions.deadline, TestsSubmissions.submitted, TestsSubmissions.test_id) \
+                .filter(TestsSubmissions.id == submission_id).first()
+        except Exception as excpt:
+            self.session.rollback()
+            print(f'Couldn\'t get submission deadline: {excpt}')
+
+        return None
+
+    def complete_expired_submissions(self, now: datetime, batch_size: int) -> Optional[List[int]]:
+        """
+        Completes up to `batch_size` submissions whose deadline is before `now`. Rows locked by another
+        sweeper are skipped, so several workers can sweep at once
+        :return: ids of completed submissions
+        """
+        try:
+            result = self.session.execute(text(f"""
+                WITH done AS (
+                    UPDATE candidates_submissions
+                    SET submitted = TRUE, time_end = deadline
+                    WHERE id IN (
+                        SELECT id FROM candidates_submissions
+                        WHERE submitted IS NOT TRUE AND deadline < :now
+                        ORDER BY deadline
+                        LIMIT :batch_size
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, test_id, score
+                ), moves AS (
+                    SELECT test_id, {HISTOGRAM_BUCKET} AS bucket, 1 AS delta FROM done
+                ), histogram AS ({HISTOGRAM_UPSERT})
+                SELECT id FROM done
+            """), {'now': now, 'batch_size': batch_size, 'bucket_size': self._histogram_bucket()})
+            ids = [row.id for row in result]
+            self.session.commit()
+
+            return ids
+        except Exception as excpt:
+            self.session.rollback()
+            print(f'Couldn\'t complete expired submissions: {excpt}')
 
         return None
 
@@ -593,9 +1134,11 @@ class ORM:
         try:
             self.session.query(Tests) \
                 .filter(Tests.id == test_id) \
-                .update({'test_name': test_name, 'max_time': max_time, 'archived': archived})
-            self.session.flush()
+                .update({'test_name': test_name, 'max_time': max_time, 'archived': archived,
+                         'version': Tests.version + 1}, synchronize_session=False)
+            self._notify_test_changed(test_id)
             self.session.commit()
+            self._test_changed(test_id)
 
             return test_id
         except Exception as excpt:
@@ -609,7 +1152,9 @@ class ORM:
             existing_test = self.session.query(Tests).filter(Tests.id == test_id).first()
             if existing_test:
                 self.session.delete(existing_test)
+                self._notify_test_changed(test_id)
                 self.session.commit()
+                self._test_changed(test_id)
                 return True
             else:
                 return False
@@ -635,6 +1180,22 @@ class ORM:
 
         return None
 
+    def get_user_version(self, u_id: int) -> Optional[int]:
+        """
+        Profile version without loading the profile
+        :param u_id: id of the user
+        :return: version or None if there is no such user
+        """
+        try:
+            row = self.session.query(Users.version).filter(Users.id == u_id).first()
+
+            return row.version if row is not None else None
+        except Exception as excpt:
+            self.session.rollback()
+            print(f'Could not get user version: {excpt}')
+
+        return None
+
     def get_document(self, doc_id: int) -> Optional[Users]:
         """
         Get user's instance by given id
@@ -734,7 +1295,11 @@ class ORM:
         :return: test instance from the database. Or None if test was not found
         """
         try:
-            test = self.session.query(Tests).get(t_id)
+            # questions are loaded together with the test, so that following `get_question` calls
+            # are served from the identity map
+            test = self.session.query(Tests) \
+                .options(selectinload(Tests.questions_tests).joinedload(QuestionsTests.questions)) \
+                .get(t_id)
             return test
         except Exception as excpt:
             self.session.rollback()
@@ -747,13 +1312,26 @@ class ORM:
         :return: all test instances from the database.
         """
         try:
-            tests = self.session.query(Tests).filter(Tests.archived == 'false').all()
+            tests = self.session.query(Tests) \
+                .options(selectinload(Tests.questions_tests)) \
+                .filter(Tests.archived == 'false').all()
             return tests
         except Exception as excpt:
             self.session.rollback()
             print(f'Couldn\'t get tests: {excpt}')
         return None
 
+    def get_tests_versions(self) -> Optional[dict]:
+        """
+        :return: {test id: version} for all tests
+        """
+        try:
+            return dict(self.session.query(Tests.id, Tests.version).all())
+        except Exception as excpt:
+            self.session.rollback()
+            print(f'Couldn\'t get tests versions: {excpt}')
+        return None
+
     def get_submission(self, sub_id) -> Optional[List[TestsSubmissions]]:
         """
         Takes all tests instances from the database
@@ -767,19 +1345,109 @@ class ORM:
             print(f'Couldn\'t get tests: {excpt}')
         return None
 
-    def get_submissions(self, test_id) -> Optional[List[TestsSubmissions]]:
+    def get_submissions(self, test_id, columns: [str] = None) -> Optional[List[TestsSubmissions]]:
         """
         Takes all tests instances from the database
+        :param columns: attributes to load, all by default
         :return: all test instances from the database.
         """
         try:
-            submissions = self.session.query(TestsSubmissions).filter(TestsSubmissions.test_id == test_id).all()
+            query = self.session.query(TestsSubmissions)
+            if columns is None or 'answers' in columns:
+                query = query.options(selectinload(TestsSubmissions.answers))
+            if columns is not None:
+                query = query.options(self._load_only(TestsSubmissions, columns))
+
+            submissions = query.filter(TestsSubmissions.test_id == test_id).all()
             return submissions
         except Exception as excpt:
             self.session.rollback()
             print(f'Couldn\'t get tests: {excpt}')
         return None
 
+    def get_ranking(self, test_id: int, limit: int, columns: [str] = None) -> Optional[List[TestsSubmissions]]:
+        """
+        Top completed submissions of the test by score, read from the `(test_id, score)` index
+        :param columns: attributes to load, all by default
+        """
+        try:
+            query = self.session.query(TestsSubmissions)
+            if columns is not None:
+                query = query.options(self._load_only(TestsSubmissions, columns))
+
+            return query.filter(TestsSubmissions.test_id == test_id) \
+                .filter(TestsSubmissions.submitted.is_(True)) \
+                .order_by(TestsSubmissions.score.desc(), TestsSubmissions.id) \
+                .limit(limit).all()
+        except Exception as excpt:
+            self.session.rollback()
+            print(f'Couldn\'t get ranking: {excpt}')
+        return None
+
+    def rebuild_scores(self, test_id: int) -> Optional[int]:
+        """
+        Recalculates score aggregates of all submissions of the test and rebuilds its histogram with the configured
+        bucket width, e.g. after `SCORE_HISTOGRAM_BUCKET` is changed. Submissions of the test are locked meanwhile,
+        so concurrent checkpoints, completions and grades wait instead of applying deltas to the old values
+        :return: number of submissions or None in case of error
+        """
+        try:
+            self.session.execute(text("""
+                SELECT id FROM candidates_submissions WHERE test_id = :test_id ORDER BY id FOR UPDATE
+            """), {'test_id': test_id})
+            result = self.session.execute(text("""
+                UPDATE candidates_submissions s
+                SET score = t.score, graded_count = t.graded_count, pending_count = t.pending_count
+                FROM (
+                    SELECT s.id, coalesce(sum(a.grade), 0) AS score, count(a.grade) AS graded_count,
+                           count(*) FILTER (WHERE a.grade IS NULL AND q.manually_grading IS TRUE) AS pending_count
+                    FROM candidates_submissions s
+                    LEFT JOIN candidates_answers a ON a.submission_id = s.id
+                    LEFT JOIN questions q ON q.id = a.question_id
+                    WHERE s.test_id = :test_id
+                    GROUP BY s.id
+                ) t
+                WHERE s.id = t.id
+            """), {'test_id': test_id})
+            self.session.query(TestsScoreHistogram).filter(TestsScoreHistogram.test_id == test_id) \
+                .delete(synchronize_session=False)
+            self.session.execute(text(f"""
+                INSERT INTO tests_score_histogram (test_id, bucket, submissions)
+                SELECT test_id, {HISTOGRAM_BUCKET}, count(*)
+                FROM candidates_submissions
+                WHERE test_id = :test_id AND submitted IS TRUE
+                GROUP BY 1, 2
+            """), {'test_id': test_id, 'bucket_size': self._histogram_bucket()})
+            self.session.commit()
+
+            return result.rowcount
+        except Exception as excpt:
+            self.session.rollback()
+            print(f'Couldn\'t rebuild scores: {excpt}')
+
+        return None
+
+    def get_score_histogram(self, test_id: int) -> Optional[List[TestsScoreHistogram]]:
+        try:
+            return self.session.query(TestsScoreHistogram) \
+                .filter(TestsScoreHistogram.test_id == test_id) \
+                .filter(TestsScoreHistogram.submissions > 0) \
+                .order_by(TestsScoreHistogram.bucket).all()
+        except Exception as excpt:
+            self.session.rollback()
+            print(f'Couldn\'t get score histogram: {excpt}')
+        return None
+
+    def get_question_stats(self, test_id: int) -> Optional[List[QuestionStats]]:
+        try:
+            return self.session.query(QuestionStats) \
+                .filter(QuestionStats.test_id == test_id) \
+                .order_by(QuestionStats.question_id).all()
+        except Exception as excpt:
+            self.session.rollback()
+            print(f'Couldn\'t get question stats: {excpt}')
+        return None
+
     def get_question(self, q_id: int) -> Optional[Questions]:
         """
         Takes the question instance from the database by the question id
@@ -861,15 +1529,61 @@ class ORM:
 
             return None
 
-    def get_users(self, page_num: int, num_of_users: int) -> Optional[List[Users]]:
+    def get_users(self, page_num: int, num_of_users: int, columns: [str] = None) -> Optional[List[Users]]:
+        if columns is None:
+            columns = ['id', 'first_name', 'last_name', 'role']
+
         try:
-            return self.session.query(Users).paginate(page_num, num_of_users, False).items
+            return self.session.query(Users) \
+                .options(self._load_only(Users, columns)) \
+                .order_by(Users.id) \
+                .paginate(page_num, num_of_users, False).items
         except Exception as excpt:
             self.session.rollback()
             print(f'Couldn\'t get users: {excpt}')
 
         return None
 
+    @staticmethod
+    def _load_only(model, attributes: [str]):
+        """
+        Loader option narrowing the SELECT to column attributes from the list
+        """
+        mapper = inspect(model)
+        columns = [attribute for attribute in attributes if attribute in mapper.column_attrs]
+        if not columns:
+            columns = [mapper.get_property_by_column(column).key for column in mapper.primary_key]
+
+        return load_only(*columns)
+
+    def _touch_user(self, u_id: int):
+        """
+        Increments profile version within current transaction
+        """
+        self.session.query(Users) \
+            .filter(Users.id == u_id) \
+            .update({'version': Users.version + 1}, synchronize_session=False)
+
+    def _touch_test(self, test_id: int):
+        """
+        Increments version of the test within current transaction and notifies other workers
+        """
+        self.session.query(Tests) \
+            .filter(Tests.id == test_id) \
+            .update({'version': Tests.version + 1}, synchronize_session=False)
+        self._notify_test_changed(test_id)
+
+    def _notify_test_changed(self, test_id: int):
+        # delivered to listeners only when the transaction commits
+        self.session.execute(text('SELECT pg_notify(:channel, :payload)'),
+                             {'channel': TESTS_CHANNEL, 'payload': str(test_id)})
+
+    @staticmethod
+    def _test_changed(test_id: int):
+        # own process does not wait for the notification
+        if application.tests_cache is not None:
+            application.tests_cache.invalidate(test_id)
+
     def _remove_record(self, model, row_id) -> bool:
         """
         Deletes row for given model
@@ -0,0 +1,68 @@
+import gc
+import os
+
+from sqlalchemy import event, exc
+
+from backend.core.backend_app import FormsBackend
+
+
+def make_engine_fork_safe(engine):
+    """
+    Refuses to hand out connections that were opened by another process.
+    A socket shared between forks gets answers meant for the other process, so such connection
+    is dropped from the pool (without closing, the parent still uses it) and a new one is opened
+    """
+
+    @event.listens_for(engine, 'connect')
+    def remember_pid(dbapi_connection, connection_record):
+        connection_record.info['pid'] = os.getpid()
+
+    @event.listens_for(engine, 'checkout')
+    def check_pid(dbapi_connection, connection_record, connection_proxy):
+        pid = os.getpid()
+        if connection_record.info.get('pid') != pid:
+            connection_record.connection = connection_proxy.connection = None
+            raise exc.DisconnectionError(
+                'Connection record belongs to pid {}, attempting to check out in pid {}'.format(
+                    connection_record.info.get('pid'), pid))
+
+
+def preload(application: FormsBackend):
+    """
+    Prepares everything that workers can share copy-on-write. Called once in the master process before fork
+    """
+    from backend.core.schema import preload_schemas
+    from backend.core.spec import ensure_spec_written
+
+    engine = application.db.engine
+    make_engine_fork_safe(engine)
+
+    preload_schemas()
+    ensure_spec_written(application, force=True)
+    application.tests_cache.warm()
+
+    # master does not serve requests, it must not keep connections or threads that children would inherit
+    application.tests_cache.listener.stop()
+    application.db.session.remove()
+    engine.dispose()
+
+    if application.metrics is not None:
+        application.metrics.clear_directory()
+
+    # objects created so far are never freed, keep gc from touching (and so copying) their pages
+    if hasattr(gc, 'freeze'):
+        gc.collect()
+        gc.freeze()
+
+
+def after_fork(application: FormsBackend):
+    """
+    Called in every worker right after fork
+    """
+    # pool inherited from the master is empty after `preload`, the fresh one is created for this process
+    application.db.engine.dispose()
+
+    # tests could change between master warm-up and this fork
+    application.tests_cache.listener.ensure_started()
+    application.tests_cache.revalidate()
+    application.sweeper.ensure_started()
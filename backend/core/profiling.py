@@ -0,0 +1,195 @@
+import cProfile
+import os
+import re
+import tempfile
+import time
+
+from flask import g, request
+
+from backend.core.backend_app import FormsBackend
+from backend.core.enums import UsersRole
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:
+    SamplingProfiler = None
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ARG = '_profile'
+# `sample` asks for the sampling profiler (speedscope output), anything else for cProfile
+SAMPLING_MODE = 'sample'
+
+PROFILE_EXTENSIONS = ('.prof', '.speedscope.json')
+PROFILE_NAME = re.compile(r'^[\w.-]+(\.prof|\.speedscope\.json)$')
+SLOT_PREFIX = '.slot_'
+
+
+class ProfileStore(object):
+    """
+    Ring directory of request profiles shared by all worker processes: only the newest `max_files` are kept.
+
+    At most one request is profiled per `interval` seconds across all workers. The slot of the current interval
+    is taken by creating a marker file exclusively, so the limit holds without any coordination between processes
+    """
+
+    def __init__(self, directory: str = None, max_files: int = 50, interval: float = 10.0):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'admission-forms-profiles')
+        self.max_files = max_files
+        self.interval = interval
+
+    def acquire_slot(self) -> bool:
+        os.makedirs(self.directory, exist_ok=True)
+
+        slot = os.path.join(self.directory, '{}{}'.format(SLOT_PREFIX, int(time.time() // self.interval)))
+        try:
+            os.close(os.open(slot, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return False
+
+        return True
+
+    def new_name(self, route: str, method: str, extension: str) -> str:
+        route = re.sub(r'[^\w-]+', '-', route).strip('-') or 'root'
+
+        return '{}_{}_{}_{}{}'.format(int(time.time() * 1000), os.getpid(), method.lower(), route, extension)
+
+    def save(self, name: str, write):
+        """
+        :param write: callable writing the profile to the given path
+        """
+        path = os.path.join(self.directory, name)
+        # renamed only when complete, listing never shows partial files
+        write(path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+        self.prune()
+
+    def prune(self):
+        files = sorted(self._names(), reverse=True)
+        for name in files[self.max_files:]:
+            self._remove(name)
+
+        current = int(time.time() // self.interval)
+        for name in os.listdir(self.directory):
+            if name.startswith(SLOT_PREFIX) and name[len(SLOT_PREFIX):].isdigit() \
+                    and int(name[len(SLOT_PREFIX):]) < current:
+                self._remove(name)
+
+    def list(self) -> [dict]:
+        """
+        :return: profiles, newest first
+        """
+        profiles = []
+        for name in sorted(self._names(), reverse=True):
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                # pruned by another worker
+                continue
+
+            profiles.append({'name': name, 'size': stat.st_size, 'created': stat.st_mtime})
+
+        return profiles
+
+    def exists(self, name: str) -> bool:
+        return PROFILE_NAME.match(name) is not None and os.path.isfile(os.path.join(self.directory, name))
+
+    def _names(self) -> [str]:
+        if not os.path.isdir(self.directory):
+            return []
+
+        return [name for name in os.listdir(self.directory) if name.endswith(PROFILE_EXTENSIONS)]
+
+    def _remove(self, name: str):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def _requested_mode():
+    return request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_ARG)
+
+
+def application_add_profiling(application: FormsBackend):
+    """
+    Profiles single requests of managers on demand: `X-Profile: 1` header or `?_profile=1` runs the request
+    under cProfile, `sample` under the sampling profiler when pyinstrument is installed. The profile name is returned
+    in the `X-Profile` response header, files are served by `/service/profiles`.
+
+    Streamed responses are profiled only until the response object is built
+    """
+    from flask_jwt_extended import get_current_user, verify_jwt_in_request_optional
+
+    config = application.app.config
+    store = application.profiles = ProfileStore(directory=config.get('PROFILING_DIR'),
+                                                max_files=config['PROFILING_MAX_FILES'],
+                                                interval=config['PROFILING_INTERVAL'])
+
+    @application.app.before_request
+    def start_profiler():
+        mode = _requested_mode()
+        if not mode or not config['PROFILING_ENABLED']:
+            return
+
+        # tokens are checked only for flagged requests, other requests do not pay for it
+        verify_jwt_in_request_optional()
+        user = get_current_user()
+        if user is None or user.role != UsersRole.MANAGER.value:
+            return
+
+        if not store.acquire_slot():
+            g.profile_skipped = True
+            return
+
+        if mode == SAMPLING_MODE and SamplingProfiler is not None:
+            profiler = SamplingProfiler(interval=config['PROFILING_SAMPLE_INTERVAL'])
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        g.profiler = profiler
+
+    @application.app.after_request
+    def save_profile(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            if g.pop('profile_skipped', False):
+                response.headers[PROFILE_HEADER] = 'rate-limited'
+            return response
+
+        route = application.route_names.get(request.endpoint, request.path)
+        try:
+            if isinstance(profiler, cProfile.Profile):
+                profiler.disable()
+                name = store.new_name(route, request.method, '.prof')
+                store.save(name, profiler.dump_stats)
+            else:
+                profiler.stop()
+                name = store.new_name(route, request.method, '.speedscope.json')
+                output = profiler.output(renderer=SpeedscopeRenderer())
+
+                def write(path):
+                    with open(path, 'w') as f:
+                        f.write(output)
+
+                store.save(name, write)
+        except OSError as excpt:
+            print(f'Couldn\'t save profile: {excpt}')
+
+            return response
+
+        response.headers[PROFILE_HEADER] = name
+
+        return response
+
+    @application.app.teardown_request
+    def stop_profiler(exc):
+        # after_request is skipped when the request fails before a response exists
+        profiler = g.pop('profiler', None)
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        elif profiler is not None:
+            profiler.stop()
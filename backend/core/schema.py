@@ -1,27 +1,41 @@
+import threading
+from datetime import datetime, date
+
 from flask_marshmallow import Schema
 from flask_marshmallow.sqla import ModelSchema
 from marshmallow import fields
-from marshmallow.validate import OneOf
+from marshmallow.validate import OneOf, Range
 from marshmallow_enum import EnumField
 from marshmallow_sqlalchemy import field_for
+from sqlalchemy import inspect
 
 from backend.core.enums import Gender
 from backend.core.models import Users, UsersAutorization, CandidatesInfo, CandidatesInterview, CandidatesDocuments, \
     CandidatesStatus, CandidatesAnswers, TestsSubmissions, QuestionsTests, Tests, Questions
 
+try:
+    from backend.config.main_local import LocalConfig as Config
+except ImportError:
+    from backend.config.main import Config
+
 
 ######
 # Models based schemas
+#
+# Relationships are dumped by lazy loading them one row at a time, so every schema lists its fields
+# explicitly and only keeps relationships that ORM getters load eagerly
 ######
 
 class UsersSchema(ModelSchema):
     class Meta:
         model = Users
+        fields = ('id', 'first_name', 'last_name', 'role')
 
 
 class UsersAutorizationSchema(ModelSchema):
     class Meta:
         model = UsersAutorization
+        exclude = ('user',)
 
     password = field_for(UsersAutorization, "password", load_only=True)
 
@@ -29,6 +43,7 @@ class UsersAutorizationSchema(ModelSchema):
 class CandidatesInfoSchema(ModelSchema):
     class Meta:
         model = CandidatesInfo
+        exclude = ('user',)
 
     gender = EnumField(Gender, validate=OneOf(Gender.names()))
 
@@ -36,21 +51,25 @@ class CandidatesInfoSchema(ModelSchema):
 class CandidatesDocumentsSchema(ModelSchema):
     class Meta:
         model = CandidatesDocuments
+        exclude = ('user',)
 
 
 class CandidatesStatusSchema(ModelSchema):
     class Meta:
         model = CandidatesStatus
+        exclude = ('user',)
 
 
 class CandidatesInterviewSchema(ModelSchema):
     class Meta:
         model = CandidatesInterview
+        exclude = ('candidate', 'staff')
 
 
 class CandidatesAnswersSchema(ModelSchema):
     class Meta:
         model = CandidatesAnswers
+        fields = ('submission_id', 'question_id', 'answer', 'grade', 'comments')
 
     question_id = field_for(CandidatesAnswers, 'question_id', dump_only=False)
     submission_id = field_for(CandidatesAnswers, 'submission_id', dump_only=False)
@@ -60,6 +79,11 @@ class TestsSubmissionsSchema(ModelSchema):
     class Meta:
         model = TestsSubmissions
         strict = True
+        fields = ('id', 'user', 'time_start', 'time_end', 'deadline', 'submitted', 'score', 'graded_count',
+                  'pending_count', 'answers')
+
+    # id of the candidate without loading the whole user
+    user = fields.Int(attribute='candidate_id', dump_only=True)
 
 
 class QuestionsTestsSchema(ModelSchema):
@@ -70,11 +94,16 @@ class QuestionsTestsSchema(ModelSchema):
 class TestsSchema(ModelSchema):
     class Meta:
         model = Tests
+        fields = ('id', 'test_name', 'max_time', 'archived', 'questions_tests')
 
 
 class QuestionsSchema(ModelSchema):
     class Meta:
         model = Questions
+        fields = ('id', 'question', 'question_type', 'answer', 'manually_grading', 'points', 'test')
+
+    # primary key of the questions_tests link is the question id itself, no need to load the link
+    test = fields.Int(attribute='id', dump_only=True)
 
 
 class TestsRegistrationSchema(Schema):
@@ -87,6 +116,23 @@ class TestsSubmissionWithAnswersSchema(Schema):
     answers = fields.List(fields.Nested(CandidatesAnswersSchema))
 
 
+class GradeSchema(Schema):
+    class Meta:
+        strict = True
+
+    submission_id = fields.Int(required=True)
+    question_id = fields.Int(required=True)
+    grade = fields.Float(required=True, validate=Range(min=0))
+    comments = fields.Str(missing=None, allow_none=True)
+
+
+class GradesSubmitSchema(Schema):
+    class Meta:
+        strict = True
+
+    grades = fields.List(fields.Nested(GradeSchema), required=True)
+
+
 ######
 # Core schemas
 ######
@@ -141,3 +187,174 @@ class ProfileInfoSchema(Schema):
 
 class TestSummarySchema(Schema):
     test = fields.Nested(TestsSchema)
+
+
+######
+# Schemas registry
+######
+
+_schemas = {}
+_schemas_lock = threading.Lock()
+
+
+def get_schema(schema_class, many: bool = False, only=None, exclude=()):
+    """
+    Returns shared schema instance, constructing it only once per process.
+    Marshmallow creates a new marshaller for every `dump` call, so instances are safe to use from several
+    threads as long as their attributes are not changed. Use them only for dumping: loading ModelSchema
+    binds instances to the session
+    """
+    # order and repeats of requested fields do not change the schema, one instance serves all spellings
+    only = tuple(sorted(set(only))) if only is not None else None
+    key = (schema_class, many, only, tuple(exclude))
+
+    schema = _schemas.get(key)
+    if schema is None:
+        with _schemas_lock:
+            schema = _schemas.get(key)
+            if schema is None:
+                schema = _schemas[key] = schema_class(many=many, only=only, exclude=exclude)
+
+    return schema
+
+
+class ColumnDumper(object):
+    """
+    Fast dump path: produces the same dicts as `schema_class` for plain model schemas, but reads column
+    attributes directly instead of going through marshmallow fields.
+    Relationships are dumped as primary keys, the same way as marshmallow-sqlalchemy `Related` fields
+    """
+
+    def __init__(self, schema_class):
+        schema = schema_class()
+        mapper = inspect(schema.opts.model)
+
+        self.columns = []
+        self.related = []
+        self._selections = {}
+
+        for name, field in schema.fields.items():
+            if field.load_only:
+                continue
+
+            attr = field.attribute or name
+            if attr in mapper.column_attrs:
+                if isinstance(field, fields.DateTime):
+                    converter = _dump_datetime
+                elif isinstance(field, fields.Date):
+                    converter = _dump_date
+                else:
+                    converter = None
+                self.columns.append((name, attr, converter))
+            elif attr in mapper.relationships:
+                relationship = mapper.relationships[attr]
+                pk_keys = [relationship.mapper.get_property_by_column(column).key
+                           for column in relationship.mapper.primary_key]
+                self.related.append((name, attr, pk_keys, relationship.uselist))
+            else:
+                raise ValueError(f'Field {name} of {schema_class.__name__} can not be dumped from columns')
+
+    def _select(self, only):
+        if only is None:
+            return self.columns, self.related
+
+        only = frozenset(only)
+        selected = self._selections.get(only)
+        if selected is None:
+            selected = self._selections[only] = ([column for column in self.columns if column[0] in only],
+                                                 [related for related in self.related if related[0] in only])
+
+        return selected
+
+    def dump(self, obj, only=None) -> dict:
+        columns, related = self._select(only)
+
+        data = {}
+        for name, attr, converter in columns:
+            value = getattr(obj, attr)
+            data[name] = converter(value) if converter is not None and value is not None else value
+
+        for name, attr, pk_keys, uselist in related:
+            value = getattr(obj, attr)
+            if uselist:
+                data[name] = [_related_key(item, pk_keys) for item in value]
+            else:
+                data[name] = _related_key(value, pk_keys) if value is not None else None
+
+        return data
+
+    def dump_many(self, objs, only=None) -> list:
+        return [self.dump(obj, only=only) for obj in objs]
+
+
+def _related_key(obj, pk_keys):
+    if len(pk_keys) == 1:
+        return getattr(obj, pk_keys[0])
+
+    return {key: getattr(obj, key) for key in pk_keys}
+
+
+def _dump_date(value):
+    return value.isoformat()
+
+
+def _dump_datetime(value):
+    # marshmallow treats naive datetimes as UTC
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.isoformat() + '+00:00'
+
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+
+_fast_dumpers = {}
+
+
+def register_fast_dumper(schema_class):
+    _fast_dumpers[schema_class] = ColumnDumper(schema_class)
+
+
+def dump(schema_class, obj, many: bool = False, only=None):
+    """
+    Serializes model instance(s) with shared schema or with the fast column dumper when it is enabled
+    and registered for this schema. `only` narrows the output to given fields
+    """
+    dumper = _fast_dumpers.get(schema_class) if Config.SERIALIZER_FAST_DUMP else None
+    if dumper is not None:
+        return dumper.dump_many(obj, only=only) if many else dumper.dump(obj, only=only)
+
+    return get_schema(schema_class, many=many, only=only).dump(obj).data
+
+
+def dump_fields(schema_class) -> [str]:
+    """
+    Names of the fields that schema outputs
+    """
+    return [name for name, field in get_schema(schema_class).fields.items() if not field.load_only]
+
+
+def field_attributes(schema_class, names) -> [str]:
+    """
+    Model attributes behind given schema fields, used to narrow the query to what is dumped
+    """
+    schema_fields = get_schema(schema_class).fields
+
+    return [schema_fields[name].attribute or name for name in names]
+
+
+def preload_schemas():
+    """
+    Constructs schemas of the hot read endpoints, so that the first requests do not pay for introspection
+    """
+    for schema_class in (TestsSchema, QuestionsSchema, CandidatesAnswersSchema, TestsSubmissionsSchema):
+        get_schema(schema_class)
+        get_schema(schema_class, many=True)
+        register_fast_dumper(schema_class)
+
+    for schema_class in (UsersSchema, CandidatesDocumentsSchema, CandidatesInfoSchema, CandidatesStatusSchema):
+        get_schema(schema_class)
+
+    get_schema(UsersSchema, many=True)
+    register_fast_dumper(UsersSchema)
+
+
+preload_schemas()
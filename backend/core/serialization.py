@@ -0,0 +1,86 @@
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+
+from flask.json import JSONEncoder
+
+from backend.core.backend_app import FormsBackend
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from backend.config.main_local import LocalConfig as Config
+except ImportError:
+    from backend.config.main import Config
+
+
+def _default(obj):
+    """
+    Conversion of the types that are stored in models but are not supported by JSON
+    """
+    if isinstance(obj, Decimal):
+        # grades are small numbers with a couple of digits after the point, float represents them exactly enough
+        return float(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def _orjson_dumps(obj) -> bytes:
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _stdlib_dumps(obj) -> bytes:
+    return json.dumps(obj, default=_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def get_backend(name: str = None):
+    """
+    Returns `(name, dumps)` of the requested backend, `auto` picks orjson when it is installed
+    """
+    name = name or Config.JSON_BACKEND
+
+    if name == 'orjson' or (name == 'auto' and orjson is not None):
+        if orjson is None:
+            raise ImportError('orjson JSON backend is configured but orjson is not installed')
+
+        return 'orjson', _orjson_dumps
+
+    return 'stdlib', _stdlib_dumps
+
+
+backend_name, dumps = get_backend()
+
+
+class BackendJSONEncoder(JSONEncoder):
+    """
+    Encoder for the places that still use `flask.jsonify`
+    """
+
+    def default(self, o):
+        try:
+            return _default(o)
+        except TypeError:
+            return super().default(o)
+
+
+def application_add_json(application: FormsBackend):
+    """
+    Uses selected JSON backend for all Flask-RESTful representations
+    """
+    from backend.helpers import json_response
+
+    application.app.json_encoder = BackendJSONEncoder
+
+    @application.api.representation('application/json')
+    def output_json(data, code, headers=None):
+        return json_response(data, code=code, headers=headers)
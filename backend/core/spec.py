@@ -1,6 +1,12 @@
 import json
+import threading
 
+import click
+from flask import request
+
+from backend.config.main import SPEC_FILENAME
 from backend.core.backend_app import FormsBackend
+from backend.helpers import get_public_path, write_public_file
 
 jwt_scheme = {
     "type": "http",
@@ -26,4 +32,64 @@ def application_add_spec(application: FormsBackend):
 
 
 def generate_spec(application: FormsBackend):
+    application.build_spec()
+
     return json.dumps(application.spec.to_dict(), indent=2)
+
+
+def write_spec(application: FormsBackend, force: bool = True) -> bool:
+    """
+    Writes the spec atomically, together with compressed variants
+    :param force: write even if the file has the same content
+    :return: whether the file was written
+    """
+    content = generate_spec(application)
+    if not force:
+        try:
+            with open(get_public_path(SPEC_FILENAME)) as f:
+                if f.read() == content:
+                    return False
+        except FileNotFoundError:
+            pass
+
+    write_public_file(SPEC_FILENAME, content, precompress=True)
+
+    return True
+
+
+_spec_lock = threading.Lock()
+_spec_written = False
+
+
+def ensure_spec_written(application: FormsBackend, force: bool = False):
+    """
+    Writes spec file at most once per process. It is generated by `flask spec` at deploy or by the preload master
+    (`force`), workers forked from it inherit the flag. Otherwise the file is written only when its content differs,
+    e.g. it is left from the previous release, so workers do not rewrite the file the others are serving
+    """
+    global _spec_written
+
+    if _spec_written:
+        return
+
+    with _spec_lock:
+        if not _spec_written:
+            write_spec(application, force=force)
+            _spec_written = True
+
+
+def application_add_spec_generation(application: FormsBackend):
+    """
+    Spec is generated on the first request to it or by `flask spec` command, not at startup
+    """
+
+    @application.app.before_request
+    def generate_spec_on_demand():
+        if request.endpoint == 'static' and (request.view_args or {}).get('filename', '').startswith(SPEC_FILENAME):
+            ensure_spec_written(application)
+
+    @application.app.cli.command('spec')
+    def spec_command():
+        """Generate OpenAPI spec and write it to the public folder"""
+        ensure_spec_written(application, force=True)
+        click.echo('Spec written to {}'.format(SPEC_FILENAME))
@@ -0,0 +1,144 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from backend.core.background import BackgroundWorker
+from backend.core.backend_app import FormsBackend
+from backend.core.errors import SubmissionClosed, SubmissionNotFound
+
+
+class SubmissionDeadlines(object):
+    """
+    Per-process LRU cache of `(deadline, closed, test_id)` by submission id.
+
+    Deadline never changes after the test start, so checkpoints are checked without queries. Completion in another
+    worker is not visible here until the deadline, for this case `ORM.save_answers` checks the submission again
+    in the same statement that writes answers.
+    """
+
+    def __init__(self, application: FormsBackend, max_size: int = 100000):
+        self.application = application
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _put(self, submission_id: int, deadline: Optional[datetime], closed: bool, test_id: int):
+        with self._lock:
+            self._entries[submission_id] = (deadline, closed, test_id)
+            self._entries.move_to_end(submission_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def started(self, submission_id: int, deadline: Optional[datetime], test_id: int):
+        self._put(submission_id, deadline, False, test_id)
+
+    def closed(self, submission_id: int):
+        deadline, _, test_id = self._entries.get(submission_id, (None, True, None))
+        self._put(submission_id, deadline, True, test_id)
+
+    def get(self, submission_id: int) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(submission_id)
+            if entry is not None:
+                # running submissions checkpoint often, they must not be evicted before idle ones
+                self._entries.move_to_end(submission_id)
+
+        if entry is not None:
+            self.application.metrics.cache_hit('deadlines')
+            return entry
+
+        self.application.metrics.cache_miss('deadlines')
+
+        row = self.application.orm.get_submission_deadline(submission_id)
+        if row is None:
+            return None
+
+        self._put(submission_id, row.deadline, bool(row.submitted), row.test_id)
+
+        return row.deadline, bool(row.submitted), row.test_id
+
+    def check_open(self, submission_id: int, now: datetime = None) -> int:
+        """
+        Raises if the submission does not exist, is completed or its time is over
+        :return: id of the submission test
+        """
+        entry = self.get(submission_id)
+        if entry is None:
+            raise SubmissionNotFound
+
+        deadline, closed, test_id = entry
+        if closed:
+            raise SubmissionClosed
+
+        grace = timedelta(seconds=self.application.app.config['SUBMISSION_GRACE_PERIOD'])
+        if deadline is not None and (now or datetime.utcnow()) > deadline + grace:
+            raise SubmissionClosed
+
+        return test_id
+
+
+def save_checkpoint(application: FormsBackend, submission_id: int, answers: [dict]) -> Optional[int]:
+    """
+    Saves answers of running submission. Shared by HTTP checkpoint and WebSocket autosave.
+    Choice answers are graded with the cached answer key of the test, so completion has nothing left to compute
+    :param answers: list of {'question_id': int, 'answer': [str]}
+    :return: number of saved answers or None in case of error
+    """
+    now = datetime.utcnow()
+    test_id = application.deadlines.check_open(submission_id, now)
+
+    # the last answer for the same question in one batch wins, Postgres refuses to update a row twice
+    latest = {}
+    for answer in answers:
+        latest[answer['question_id']] = {'question_id': answer['question_id'], 'answer': answer['answer']}
+
+    test = application.tests_cache.get_test(test_id) if test_id is not None else None
+    if test is not None and test.answer_key is not None and latest:
+        grades = test.answer_key.grade_answers(list(latest), [answer['answer'] for answer in latest.values()])
+        for answer, grade in zip(latest.values(), grades):
+            answer['grade'] = grade
+
+    # deadline in the statement is shifted by the grace period, the same way as in `check_open`
+    grace = timedelta(seconds=application.app.config['SUBMISSION_GRACE_PERIOD'])
+    saved = application.orm.save_answers(submission_id, list(latest.values()), now=now - grace)
+    if saved == 0 and latest:
+        # completed by another worker
+        application.deadlines.closed(submission_id)
+        raise SubmissionClosed
+
+    return saved
+
+
+class SubmissionsSweeper(BackgroundWorker):
+    """
+    Completes submissions whose deadline has passed, in batches
+    """
+    name = 'submissions-sweeper'
+
+    def run_once(self):
+        config = self.application.app.config
+        grace = timedelta(seconds=config['SUBMISSION_GRACE_PERIOD'])
+
+        self.sweep(datetime.utcnow() - grace, config['SWEEPER_BATCH_SIZE'])
+        self._stop.wait(config['SWEEPER_INTERVAL'])
+
+    def sweep(self, now: datetime, batch_size: int) -> int:
+        """
+        :return: number of completed submissions
+        """
+        total = 0
+        with self.application.app.app_context():
+            while True:
+                ids = self.application.orm.complete_expired_submissions(now, batch_size)
+                if not ids:
+                    break
+
+                for submission_id in ids:
+                    self.application.deadlines.closed(submission_id)
+                total += len(ids)
+
+                if len(ids) < batch_size:
+                    break
+
+        return total
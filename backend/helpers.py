@@ -1,7 +1,7 @@
 import os
 
 from datetime import datetime
-from flask import jsonify
+from flask import current_app, request
 
 try:
     from backend.config.main_local import LocalConfig as Config
@@ -26,13 +26,69 @@ def generic_response(status, msg=None, code=None, **kwargs):
     if msg is not None:
         data['message'] = [msg]
 
-    response = jsonify(data)
+    return json_response(data, code=code)
+
+
+def json_response(data, code=None, headers=None):
+    """
+    Builds JSON response with the configured JSON backend. Bytes are treated as already serialized JSON
+    """
+    from backend.core.serialization import dumps
+
+    body = data if isinstance(data, bytes) else dumps(data)
+    response = current_app.response_class(body, mimetype='application/json')
     if code is not None:
         response.status_code = code
+    if headers:
+        response.headers.extend(headers)
 
     return response
 
 
+def not_modified_response(etag: str):
+    """
+    Returns 304 response when client already has the version identified by `etag`, None otherwise.
+    Compressed representations carry the encoding as ETag suffix, see `backend.core.compression`
+    """
+    if_none_match = request.if_none_match
+    matched = next((tag for tag in (etag, etag + '-gzip', etag + '-br') if if_none_match.contains(tag)), None)
+    if matched is None:
+        return None
+
+    # the empty body is not compressed, so the validator of the revalidated representation is set here
+    response = current_app.response_class(status=304)
+    response.set_etag(matched)
+
+    return response
+
+
+def test_etag(test_id: int, version: int) -> str:
+    return 't{}-v{}'.format(test_id, version)
+
+
+def profile_etag(u_id: int, version: int) -> str:
+    return 'u{}-v{}'.format(u_id, version)
+
+
+def requested_fields(available: [str]):
+    """
+    Parses sparse fieldset from `?fields=id,name` query parameter
+    :param available: fields that can be requested
+    :return: list of requested fields or None if all fields are required
+    """
+    from backend.core.errors import UnknownFields
+
+    raw = request.args.get('fields')
+    if not raw:
+        return None
+
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    if not fields or any(field not in available for field in fields):
+        raise UnknownFields
+
+    return fields
+
+
 def _epoch_utc_to_datetime(epoch_utc):
     """
     Helper function for converting epoch timestamps (as stored in JWTs) into
@@ -45,6 +101,22 @@ def get_public_path(subpath):
     return os.path.abspath(Config.STATIC_FOLDER + '/' + subpath)
 
 
-def write_public_file(path, content):
-    with open(get_public_path(path), 'w+') as f:
-        f.write(content)
+def write_atomic(path: str, data: bytes):
+    """
+    Other processes serving the file see either the old or the new content, never a partial one
+    """
+    tmp_path = '{}.tmp{}'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def write_public_file(path, content, precompress=False):
+    data = content.encode()
+    write_atomic(get_public_path(path), data)
+
+    if precompress:
+        from backend.core.compression import write_precompressed
+
+        # compressed from memory, the file on disk may be replaced by another process meanwhile
+        write_precompressed(get_public_path(path), data)
@@ -0,0 +1,285 @@
+"""
+Endpoint benchmark against a local Postgres: latency and number of SQL queries per request of login, token refresh,
+test fetch, checkpoint, users list, profile and test submissions, at several data sizes.
+
+The database is seeded by `db/fake_data.py` up to every size in turn (existing rows are counted, only the
+difference is generated), requests go through the Flask test client, so only the application is measured.
+Point the configuration to a disposable database and apply migrations first:
+
+    flask db upgrade
+    python -m benchmarks.endpoints --sizes 1000,10000,100000 --label master --json master.json
+    git checkout feature && python -m benchmarks.endpoints --sizes 1000,10000,100000 --label feature --json feature.json
+
+    python -m benchmarks.endpoints compare master.json feature.json
+
+`compare` exits with code 1 when median latency grows by more than `--threshold` or a request makes more queries.
+"""
+import argparse
+import json
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import psycopg2
+
+MANAGER_EMAIL = 'bench-manager@example.com'
+
+
+class QueryCounter(object):
+    """
+    Counts statements executed by the benchmarking thread, background writers are not counted
+    """
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        self._thread = threading.get_ident()
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        if threading.get_ident() == self._thread:
+            self.count += 1
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(share * (len(values) - 1))))] if values else 0.0
+
+
+def git_commit():
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL)
+        return output.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed(args, size, tests):
+    """
+    Grows the database to `size` candidates
+    :return: specs of the tests that receive submissions
+    """
+    from db import fake_data
+
+    connection = psycopg2.connect(args.url)
+    try:
+        if tests is None:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT test_id FROM candidates_submissions
+                    GROUP BY test_id ORDER BY count(*) DESC LIMIT %s
+                """, (args.tests, ))
+                test_ids = [row[0] for row in cursor.fetchall()]
+            tests = fake_data.load_tests(connection, test_ids) if test_ids else \
+                fake_data.create_tests(connection, args.tests, args.questions, random.Random(1))
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM users WHERE role = 1')
+            candidates = cursor.fetchone()[0]
+    finally:
+        connection.close()
+
+    if candidates < size:
+        fake_data.generate(args.url, tests, size - candidates, args.workers, password=args.password, seed=size)
+
+    return tests
+
+
+def ensure_manager(application, password):
+    from passlib.hash import argon2
+
+    from backend.core.enums import UsersRole
+
+    with application.app.app_context():
+        orm = application.orm
+        if orm.get_user_auth_by_email(email=MANAGER_EMAIL) is None:
+            user = orm.add_user(first_name='Bench', last_name='Manager', role=UsersRole.MANAGER)
+            orm.add_candidates_authorization(u_id=user.id, email=MANAGER_EMAIL, password=argon2.hash(password))
+
+
+def login(client, email, password):
+    response = client.post('/auth/login', json={'email': email, 'password': password})
+    if response.status_code != 200:
+        sys.exit(f'Login of {email} failed: {response.status_code} {response.data!r}')
+
+    return response.get_json()
+
+
+def prepare(client, args, tests):
+    """
+    Tokens and ids used by the measured requests
+    """
+    connection = psycopg2.connect(args.url)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT a.id, a.email FROM candidates_autorization a
+                JOIN users u ON u.id = a.id
+                WHERE u.role = 1 AND a.email LIKE 'candidate%%@example.com'
+                ORDER BY a.id DESC LIMIT 1
+            """)
+            candidate_id, candidate_email = cursor.fetchone()
+    finally:
+        connection.close()
+
+    test_id, _, questions = tests[0]
+    candidate = login(client, candidate_email, args.password)
+    manager = login(client, MANAGER_EMAIL, args.password)
+
+    response = client.post(f'/tests/{test_id}/start', headers=bearer(candidate['access_token']))
+    if response.status_code != 201:
+        sys.exit(f'Could not start test {test_id}: {response.status_code} {response.data!r}')
+
+    return {
+        'test_id': test_id,
+        'question_ids': [question_id for question_id, _, _, _ in questions],
+        'candidate_id': candidate_id,
+        'candidate_email': candidate_email,
+        'candidate': candidate,
+        'manager': manager,
+        'submission_id': response.get_json()['message'][0],
+    }
+
+
+def bearer(token):
+    return {'Authorization': 'Bearer ' + token}
+
+
+def endpoints(client, args, fixtures):
+    candidate = bearer(fixtures['candidate']['access_token'])
+    manager = bearer(fixtures['manager']['access_token'])
+    test_id = fixtures['test_id']
+    question_ids = fixtures['question_ids']
+    submission_id = fixtures['submission_id']
+
+    def checkpoint(i):
+        answers = [{'submission_id': submission_id, 'question_id': question_ids[(i + j) % len(question_ids)],
+                    'answer': [random.choice('abcde')]} for j in range(5)]
+        return client.put(f'/submissions/{submission_id}/checkpoint', headers=candidate, json={'answers': answers})
+
+    return {
+        'login': lambda i: client.post('/auth/login', json={'email': fixtures['candidate_email'],
+                                                            'password': args.password}),
+        'refresh': lambda i: client.post('/auth/refresh', headers=bearer(fixtures['candidate']['refresh_token'])),
+        'test_get': lambda i: client.get(f'/tests/{test_id}', headers=candidate),
+        'checkpoint': checkpoint,
+        'users_list': lambda i: client.get(f'/profile/list/{i % 10 + 1}', headers=manager),
+        'profile': lambda i: client.get(f'/profile/{fixtures["candidate_id"]}', headers=manager),
+        'test_submissions': lambda i: client.get(f'/tests/{test_id}/submissions', headers=manager),
+    }
+
+
+def measure(call, counter, repeat, warmup=2):
+    for i in range(warmup):
+        call(i)
+
+    latencies, queries, errors = [], [], 0
+    for i in range(repeat):
+        before = counter.count
+        started = time.perf_counter()
+        response = call(i)
+        latencies.append(time.perf_counter() - started)
+        queries.append(counter.count - before)
+        if response.status_code >= 400:
+            errors += 1
+
+    return {
+        'requests': repeat,
+        'errors': errors,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'mean_ms': statistics.mean(latencies) * 1000,
+        'queries': statistics.mean(queries),
+    }
+
+
+def run(args):
+    import server
+
+    server.flask_app.config['SQLALCHEMY_DATABASE_URI'] = args.url
+    application = server.application
+    client = server.flask_app.test_client()
+
+    ensure_manager(application, args.password)
+    counter = QueryCounter(application.db.engine)
+
+    results = {'label': args.label, 'commit': git_commit(), 'sizes': {}}
+    tests = None
+    for size in args.sizes:
+        tests = seed(args, size, tests)
+        fixtures = prepare(client, args, tests)
+
+        results['sizes'][str(size)] = {name: measure(call, counter, args.repeat)
+                                       for name, call in endpoints(client, args, fixtures).items()}
+        print_results({'label': args.label, 'sizes': {str(size): results['sizes'][str(size)]}})
+
+    return results
+
+
+def print_results(results):
+    print(f'{"size":>9}  {"endpoint":<18}{"p50 ms":>9}{"p95 ms":>9}{"queries":>9}{"errors":>8}')
+    for size, stats in results['sizes'].items():
+        for name, values in stats.items():
+            print(f'{size:>9}  {name:<18}{values["p50_ms"]:>9.2f}{values["p95_ms"]:>9.2f}'
+                  f'{values["queries"]:>9.1f}{values["errors"]:>8}')
+
+
+def compare(base, new, threshold):
+    """
+    :return: number of regressions
+    """
+    regressions = 0
+    print(f'{"size":>9}  {"endpoint":<18}{"p50 base":>10}{"p50 new":>10}{"change":>9}{"queries":>14}')
+    for size, stats in new['sizes'].items():
+        for name, values in stats.items():
+            before = base['sizes'].get(size, {}).get(name)
+            if before is None:
+                continue
+
+            change = values['p50_ms'] / before['p50_ms'] - 1 if before['p50_ms'] else 0.0
+            regressed = change > threshold or values['queries'] > before['queries']
+            regressions += regressed
+            print(f'{size:>9}  {name:<18}{before["p50_ms"]:>10.2f}{values["p50_ms"]:>10.2f}{change:>+9.0%}'
+                  f'{before["queries"]:>7.1f}->{values["queries"]:<5.1f}{"  REGRESSION" if regressed else ""}')
+
+    return regressions
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'compare':
+        parser = argparse.ArgumentParser(prog='benchmarks.endpoints compare')
+        parser.add_argument('base')
+        parser.add_argument('new')
+        parser.add_argument('--threshold', type=float, default=0.2, help='allowed growth of median latency')
+        args = parser.parse_args(sys.argv[2:])
+
+        with open(args.base) as base_file, open(args.new) as new_file:
+            sys.exit(1 if compare(json.load(base_file), json.load(new_file), args.threshold) else 0)
+
+    try:
+        from backend.config.main_local import LocalConfig as Config
+    except ImportError:
+        from backend.config.main import Config
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=Config.SQLALCHEMY_DATABASE_URI, help='database URL')
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')], default=[1000, 10000],
+                        help='comma separated numbers of candidates')
+    parser.add_argument('--tests', type=int, default=3, help='tests receiving submissions')
+    parser.add_argument('--questions', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=50, help='measured requests per endpoint and size')
+    parser.add_argument('--workers', type=int, default=4, help='processes seeding the database')
+    parser.add_argument('--password', default='123456')
+    parser.add_argument('--label', default='run')
+    parser.add_argument('--json', help='save results to this file')
+    args = parser.parse_args()
+
+    results = run(args)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
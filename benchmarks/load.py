@@ -0,0 +1,143 @@
+"""
+Load benchmark of the exam-time endpoints: test fetch (`GET /tests/<id>`) and autosave
+(`PUT /submissions/<id>/checkpoint`).
+
+Logs in as a candidate, starts a submission and then hammers both endpoints with a fixed number
+of concurrent clients. Results of several runs can be compared:
+
+    python wsgi.py                                            # gthread, from Config
+    python -m benchmarks.load --email c@innopolis.ru --password 123456 --test-id 1 --label gthread --json gthread.json
+
+    GUNICORN_CMD_ARGS="--worker-class sync" python wsgi.py
+    python -m benchmarks.load ... --label sync --json sync.json
+
+    GUNICORN_CMD_ARGS="--worker-class gevent" python wsgi.py
+    python -m benchmarks.load ... --label gevent --json gevent.json
+
+    python -m benchmarks.load compare sync.json gthread.json gevent.json
+"""
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def request(url, method='GET', token=None, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, method=method)
+    req.add_header('Content-Type', 'application/json')
+    if token is not None:
+        req.add_header('Authorization', 'Bearer ' + token)
+
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as err:
+        return err.code, err.read()
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(share * (len(values) - 1))))]
+
+
+def run(args):
+    base = args.url.rstrip('/')
+
+    status, body = request(base + '/auth/login', 'POST', payload={'email': args.email, 'password': args.password})
+    if status != 200:
+        sys.exit(f'Login failed: {status} {body!r}')
+    token = json.loads(body)['access_token']
+
+    status, body = request(f'{base}/tests/{args.test_id}/start', 'POST', token=token)
+    if status != 201:
+        sys.exit(f'Could not start test: {status} {body!r}')
+    submission_id = json.loads(body)['message'][0]
+
+    status, body = request(f'{base}/tests/{args.test_id}', token=token)
+    question_ids = [question['id'] for question in json.loads(body).get('questions', [])] or [0]
+
+    endpoints = {
+        'test_fetch': lambda i: request(f'{base}/tests/{args.test_id}', token=token),
+        'checkpoint': lambda i: request(f'{base}/submissions/{submission_id}/checkpoint', 'PUT', token=token,
+                                        payload={'answers': [{'question_id': question_ids[i % len(question_ids)],
+                                                              'submission_id': submission_id,
+                                                              'answer': [str(i % 4)]}]}),
+    }
+
+    results = {'label': args.label, 'concurrency': args.concurrency, 'endpoints': {}}
+    for name, call in endpoints.items():
+        latencies = []
+        errors = 0
+        lock = threading.Lock()
+
+        def worker(i):
+            nonlocal errors
+            start = time.perf_counter()
+            status, _ = call(i)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(worker, range(args.requests)))
+        duration = time.perf_counter() - started
+
+        results['endpoints'][name] = {
+            'requests': args.requests,
+            'errors': errors,
+            'rps': args.requests / duration,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'mean_ms': statistics.mean(latencies) * 1000,
+        }
+
+    return results
+
+
+def print_table(all_results):
+    print(f'{"mode":<12}{"endpoint":<14}{"rps":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"errors":>8}')
+    for results in all_results:
+        for name, stats in results['endpoints'].items():
+            print(f'{results["label"]:<12}{name:<14}{stats["rps"]:>10.1f}{stats["p50_ms"]:>10.1f}'
+                  f'{stats["p95_ms"]:>10.1f}{stats["p99_ms"]:>10.1f}{stats["errors"]:>8}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'compare':
+        loaded = []
+        for path in sys.argv[2:]:
+            with open(path) as f:
+                loaded.append(json.load(f))
+        print_table(loaded)
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--email', required=True, help='candidate account')
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--test-id', type=int, required=True)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=2000, help='requests per endpoint')
+    parser.add_argument('--label', default='run')
+    parser.add_argument('--json', help='save results to this file')
+    args = parser.parse_args()
+
+    results = run(args)
+    print_table([results])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,193 @@
+"""
+Replays recorded traffic against a running instance, keeping the original pacing (or a multiple of it),
+and reports throughput and latency percentiles per route. Latency is measured from the moment the request was
+due, like an open-loop load generator, so a saturated worker pool shows up in the percentiles.
+
+Traffic comes from `request_log` rows (staff and managers) or from a capture file with one JSON object
+per line in the same shape: `{"user_id": 1, "method": "PUT", "path": "/submissions/7/checkpoint",
+"data": {...}, "date": "2019-04-20T12:00:01"}`. Access tokens are minted locally for every recorded user,
+so the target instance must use the same `JWT_SECRET_KEY` and the same users:
+
+    python -m benchmarks.replay --since "2019-04-20 12:00" --until "2019-04-20 13:00" --speed 10
+    python -m benchmarks.replay --capture exam.ndjson --speed 1 --concurrency 200 --json replay.json
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import psycopg2
+
+from benchmarks.load import percentile, request
+
+# requests dispatched later than this after their due time are reported as late
+LATE_AFTER = 0.01
+
+
+def read_request_log(url, since=None, until=None, first_id=None, last_id=None):
+    conditions, params = [], []
+    for condition, value in (('date >= %s', since), ('date < %s', until), ('id >= %s', first_id),
+                             ('id <= %s', last_id)):
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+
+    connection = psycopg2.connect(url)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT user_id, method, path, data, date FROM request_log {} ORDER BY date, id'.format(
+                'WHERE ' + ' AND '.join(conditions) if conditions else ''), params)
+            rows = cursor.fetchall()
+    finally:
+        connection.close()
+
+    # `data` is stored as a JSON string
+    return [{'user_id': user_id, 'method': method, 'path': path, 'data': json.loads(data) if data else None,
+             'date': date} for user_id, method, path, data, date in rows]
+
+
+def read_capture(path):
+    records = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                record['date'] = datetime.fromisoformat(record['date'])
+                records.append(record)
+
+    records.sort(key=lambda record: record['date'])
+    return records
+
+
+def mint_tokens(url, user_ids, lifetime):
+    """
+    Access tokens of recorded users, identity is the user's email like in `UserLogin`
+    """
+    from flask_jwt_extended import create_access_token
+
+    import server
+
+    connection = psycopg2.connect(url)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT id, email FROM candidates_autorization WHERE id = ANY(%s)', (list(user_ids), ))
+            emails = dict(cursor.fetchall())
+    finally:
+        connection.close()
+
+    with server.flask_app.app_context():
+        return {user_id: create_access_token(identity=email, expires_delta=lifetime)
+                for user_id, email in emails.items()}
+
+
+def route_of(method, path):
+    """
+    Groups requests by route: numeric path segments are replaced with `<id>`
+    """
+    return '{} {}'.format(method, '/'.join('<id>' if part.isdigit() else part for part in path.split('/')))
+
+
+def replay(records, tokens, base_url, speed, concurrency):
+    stats = defaultdict(lambda: {'latencies': [], 'errors': 0})
+    lags = []
+    lock = threading.Lock()
+
+    def send(record, due):
+        # latency is counted from the due time, so waiting for a free worker is not hidden
+        # when the target (or this client) can not keep up
+        lag = time.perf_counter() - due
+        try:
+            status, _ = request(base_url + record['path'], record['method'], tokens.get(record['user_id']),
+                                record['data'])
+        except OSError:
+            # refused connections and timeouts count as errors
+            status = 599
+        elapsed = time.perf_counter() - due
+
+        with lock:
+            lags.append(lag)
+            route = stats[route_of(record['method'], record['path'])]
+            route['latencies'].append(elapsed)
+            route['errors'] += status >= 400
+
+    first = records[0]['date']
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for record in records:
+            due = started + (record['date'] - first).total_seconds() / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, record, due)
+    duration = time.perf_counter() - started
+
+    results = {'speed': speed, 'concurrency': concurrency, 'requests': len(records), 'duration': duration,
+               'rps': len(records) / duration,
+               'late_requests': sum(lag > LATE_AFTER for lag in lags),
+               'max_lag_ms': max(lags) * 1000 if lags else 0.0, 'routes': {}}
+    for route, values in sorted(stats.items()):
+        latencies = values['latencies']
+        results['routes'][route] = {
+            'requests': len(latencies),
+            'errors': values['errors'],
+            'rps': len(latencies) / duration,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'mean_ms': statistics.mean(latencies) * 1000,
+        }
+
+    return results
+
+
+def print_results(results):
+    print(f'{results["requests"]} requests in {results["duration"]:.1f}s ({results["rps"]:.1f} rps) at '
+          f'{results["speed"]}x, {results["late_requests"]} sent over {LATE_AFTER * 1000:.0f}ms late '
+          f'(max {results["max_lag_ms"]:.0f}ms)')
+    print(f'{"route":<48}{"count":>8}{"rps":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"errors":>8}')
+    for route, values in results['routes'].items():
+        print(f'{route:<48}{values["requests"]:>8}{values["rps"]:>9.1f}{values["p50_ms"]:>9.1f}'
+              f'{values["p95_ms"]:>9.1f}{values["p99_ms"]:>9.1f}{values["errors"]:>8}')
+
+
+if __name__ == '__main__':
+    try:
+        from backend.config.main_local import LocalConfig as Config
+    except ImportError:
+        from backend.config.main import Config
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', default='http://127.0.0.1:8000', help='instance to replay against')
+    parser.add_argument('--url', default=Config.SQLALCHEMY_DATABASE_URI,
+                        help='database with request_log and users of the recorded traffic')
+    parser.add_argument('--capture', help='replay this file instead of request_log')
+    parser.add_argument('--since', type=datetime.fromisoformat, help='request_log date from, inclusive')
+    parser.add_argument('--until', type=datetime.fromisoformat, help='request_log date to, exclusive')
+    parser.add_argument('--first-id', type=int, help='request_log id from, inclusive')
+    parser.add_argument('--last-id', type=int, help='request_log id to, inclusive')
+    parser.add_argument('--speed', type=float, default=1.0, help='10 replays an hour of traffic in 6 minutes')
+    parser.add_argument('--concurrency', type=int, default=100, help='requests in flight at most')
+    parser.add_argument('--json', help='save results to this file')
+    args = parser.parse_args()
+
+    if args.capture:
+        records = read_capture(args.capture)
+    else:
+        records = read_request_log(args.url, args.since, args.until, args.first_id, args.last_id)
+    if not records:
+        raise SystemExit('Nothing to replay')
+
+    span = records[-1]['date'] - records[0]['date']
+    tokens = mint_tokens(args.url, {record['user_id'] for record in records},
+                         lifetime=span / args.speed + timedelta(hours=1))
+
+    results = replay(records, tokens, args.target.rstrip('/'), args.speed, args.concurrency)
+    print_results(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,78 @@
+"""
+Microbenchmark of response serialization of the hot read endpoints.
+
+Compares constructing ModelSchema per request (the old way), shared schemas from the registry
+and the fast column dumper. Works on transient model instances, so no database is needed.
+
+Run from the project root:
+    python -m benchmarks.serializers [--rows 1000] [--repeat 5]
+"""
+import argparse
+import timeit
+from datetime import date
+from decimal import Decimal
+
+import server  # noqa: F401 - initializes application before models are imported
+from backend.core.models import Tests, Questions, QuestionsTests, CandidatesAnswers, TestsSubmissions
+from backend.core.schema import TestsSchema, QuestionsSchema, CandidatesAnswersSchema, TestsSubmissionsSchema, \
+    ColumnDumper, get_schema
+
+
+def make_objects(rows):
+    tests = []
+    questions = []
+    for i in range(rows):
+        test = Tests(id=i, test_name=f'Test {i}', max_time=60, archived=False)
+        test.questions_tests = [QuestionsTests(question_id=i * 10 + j, test_id=i) for j in range(10)]
+        tests.append(test)
+
+        questions.append(Questions(id=i, question='Which of the following is true? ' * 5, question_type=1,
+                                   answer='1', manually_grading=False, points=2))
+
+    answers = [CandidatesAnswers(submission_id=i, question_id=i, answer=['1', '3'], grade=Decimal('1.5'),
+                                 comments=None) for i in range(rows)]
+    submissions = [TestsSubmissions(id=i, candidate_id=i, test_id=1, time_start=date.today(), submitted=False)
+                   for i in range(rows)]
+
+    return {
+        TestsSchema: tests,
+        QuestionsSchema: questions,
+        CandidatesAnswersSchema: answers,
+        TestsSubmissionsSchema: submissions,
+    }
+
+
+def run(rows, repeat):
+    with server.flask_app.app_context():
+        objects = make_objects(rows)
+
+        print(f'{"schema":<26}{"per request":>14}{"registry":>14}{"columns":>14}   (best of {repeat}, {rows} rows)')
+        for schema_class, objs in objects.items():
+            dumper = ColumnDumper(schema_class)
+            shared = get_schema(schema_class)
+
+            assert dumper.dump(objs[0]) == shared.dump(objs[0]).data
+
+            def per_request():
+                for obj in objs:
+                    schema_class().dump(obj)
+
+            def registry():
+                for obj in objs:
+                    shared.dump(obj)
+
+            def columns():
+                for obj in objs:
+                    dumper.dump(obj)
+
+            results = [min(timeit.repeat(fn, number=1, repeat=repeat)) for fn in (per_request, registry, columns)]
+            print(f'{schema_class.__name__:<26}' + ''.join(f'{t * 1000:>12.1f}ms' for t in results))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    run(args.rows, args.repeat)
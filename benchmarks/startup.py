@@ -0,0 +1,51 @@
+"""
+Startup time benchmark.
+
+Every run imports `server` in a fresh interpreter and reports how long the import took
+and how long the OpenAPI spec generation takes afterwards. No database is needed.
+
+Run from the project root:
+    python -m benchmarks.startup [--runs 5] [--json startup.json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter()
+from backend.core.spec import generate_spec
+generate_spec(server.application)
+finished = time.perf_counter()
+print(json.dumps({'import': imported - start, 'spec': finished - imported}))
+"""
+
+
+def measure(runs):
+    results = {'import': [], 'spec': []}
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', PROBE])
+        sample = json.loads(output.decode().strip().splitlines()[-1])
+        for key, value in sample.items():
+            results[key].append(value)
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', help='save raw timings to this file')
+    args = parser.parse_args()
+
+    timings = measure(args.runs)
+    for key, values in timings.items():
+        print(f'{key:<8} median {statistics.median(values) * 1000:8.1f}ms   min {min(values) * 1000:8.1f}ms')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(timings, f, indent=2)
@@ -0,0 +1,94 @@
+"""
+Gunicorn settings, used by `python wsgi.py` or `gunicorn -c gunicorn.conf.py wsgi:application`.
+Values come from `Config.SERVER_*`; any of them can be overridden for one run with `GUNICORN_CMD_ARGS`.
+
+With `preload_app` the master imports the application, generates the spec, fills caches and closes
+its DB connections before forking, so workers start immediately and share that memory copy-on-write.
+
+gevent workers monkey-patch only after fork, in `init_process`: threads and locks created before it are real OS ones
+that block the hub. So in this mode the app is not preloaded and background workers start in `post_worker_init`.
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import shlex
+import sys
+
+try:
+    from backend.config.main_local import LocalConfig as Config
+except ImportError:
+    from backend.config.main import Config
+
+
+def _is_gevent(worker_class: str) -> bool:
+    # `gevent`, `gevent_wsgi`, `egg:gunicorn#gevent`, `gunicorn.workers.ggevent.GeventWorker`
+    return 'gevent' in worker_class.lower()
+
+
+def _worker_class() -> str:
+    # `GUNICORN_CMD_ARGS` and command line are applied after this file (in this order), while preload
+    # has to be decided here. `python wsgi.py` passes its arguments to gunicorn, so they are in `sys.argv` as well
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('-k', '--worker-class', default=Config.SERVER_WORKER_CLASS)
+    known, _ = parser.parse_known_args(shlex.split(os.environ.get('GUNICORN_CMD_ARGS', '')))
+    known, _ = parser.parse_known_args(sys.argv[1:], namespace=known)
+
+    return known.worker_class
+
+
+bind = Config.SERVER_BIND
+workers = Config.SERVER_WORKERS or multiprocessing.cpu_count() * 2 + 1
+worker_class = Config.SERVER_WORKER_CLASS
+threads = Config.SERVER_THREADS
+worker_connections = Config.SERVER_WORKER_CONNECTIONS
+keepalive = Config.SERVER_KEEPALIVE
+timeout = Config.SERVER_TIMEOUT
+graceful_timeout = Config.SERVER_GRACEFUL_TIMEOUT
+max_requests = Config.SERVER_MAX_REQUESTS
+max_requests_jitter = max_requests // 10
+
+preload_app = not _is_gevent(_worker_class())
+
+
+def on_starting(arbiter):
+    if _is_gevent(arbiter.cfg.worker_class_str) and arbiter.cfg.preload_app:
+        # e.g. `--preload` given explicitly
+        sys.exit('gevent workers can not be used with preload_app, see gunicorn.conf.py')
+
+    # metrics files of the previous run; the app may be not loaded in this process, so no `MetricsRegistry` here
+    for path in glob.glob(os.path.join(Config.METRICS_DIR, 'metrics_*.json')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    if arbiter.cfg.preload_app:
+        from server import preload
+
+        preload()
+
+
+def post_fork(arbiter, worker):
+    if _is_gevent(arbiter.cfg.worker_class_str):
+        # not patched yet, see `post_worker_init`
+        return
+
+    from server import after_fork
+
+    after_fork()
+
+
+def post_worker_init(worker):
+    if not _is_gevent(worker.cfg.worker_class_str):
+        return
+
+    # psycopg2 waits for the server in C code, without this one query blocks all greenlets of the worker
+    from psycogreen.gevent import patch_psycopg
+
+    patch_psycopg()
+
+    # the app is loaded after monkey-patching, its background workers run as greenlets
+    from server import after_fork
+
+    after_fork()
@@ -0,0 +1,36 @@
+"""question stats
+
+Revision ID: 2d5c8e4f7a16
+Revises: 9a6e2f1b3c74
+Create Date: 2026-10-19 18:12:40.552803
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d5c8e4f7a16'
+down_revision = '9a6e2f1b3c74'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('question_stats',
+                    sa.Column('question_id', sa.BigInteger(), nullable=False),
+                    sa.Column('test_id', sa.BigInteger(), nullable=True),
+                    sa.Column('answers', sa.Integer(), nullable=False),
+                    sa.Column('difficulty', sa.Float(), nullable=True),
+                    sa.Column('discrimination', sa.Float(), nullable=True),
+                    sa.Column('computed_at', sa.DateTime(), nullable=False),
+                    sa.ForeignKeyConstraint(['question_id'], ['questions.id'], ondelete='CASCADE'),
+                    sa.ForeignKeyConstraint(['test_id'], ['tests.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('question_id')
+                    )
+    op.create_index(op.f('ix_question_stats_test_id'), 'question_stats', ['test_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_question_stats_test_id'), table_name='question_stats')
+    op.drop_table('question_stats')
@@ -0,0 +1,24 @@
+"""tests version
+
+Revision ID: 3f1c2a7d9e10
+Revises: 0a88504d939f
+Create Date: 2026-10-19 10:12:31.514208
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a7d9e10'
+down_revision = '0a88504d939f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('tests', sa.Column('version', sa.BigInteger(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('tests', 'version')
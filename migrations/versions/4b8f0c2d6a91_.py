@@ -0,0 +1,65 @@
+"""score aggregates and histogram
+
+Revision ID: 4b8f0c2d6a91
+Revises: e7d3a91c5f02
+Create Date: 2026-10-19 16:21:05.390214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b8f0c2d6a91'
+down_revision = 'e7d3a91c5f02'
+branch_labels = None
+depends_on = None
+
+# default Config.SCORE_HISTOGRAM_BUCKET, with another width run `flask rebuild-scores` after the upgrade
+BUCKET_SIZE = 1
+
+
+def upgrade():
+    op.add_column('candidates_submissions',
+                  sa.Column('graded_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('candidates_submissions',
+                  sa.Column('pending_count', sa.Integer(), server_default='0', nullable=False))
+    op.create_table('tests_score_histogram',
+                    sa.Column('test_id', sa.BigInteger(), nullable=False),
+                    sa.Column('bucket', sa.Integer(), nullable=False),
+                    sa.Column('submissions', sa.Integer(), nullable=False),
+                    sa.ForeignKeyConstraint(['test_id'], ['tests.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('test_id', 'bucket')
+                    )
+    # ranking reads top-N straight from the index
+    op.execute("""
+        CREATE INDEX ix_candidates_submissions_ranking ON candidates_submissions (test_id, score DESC, id)
+        WHERE submitted IS TRUE
+    """)
+
+    op.execute("""
+        UPDATE candidates_submissions s
+        SET score = coalesce(t.score, 0), graded_count = t.graded_count, pending_count = t.pending_count
+        FROM (
+            SELECT a.submission_id, sum(a.grade) AS score, count(a.grade) AS graded_count,
+                   count(*) FILTER (WHERE a.grade IS NULL AND q.manually_grading IS TRUE) AS pending_count
+            FROM candidates_answers a
+            JOIN questions q ON q.id = a.question_id
+            GROUP BY a.submission_id
+        ) t
+        WHERE s.id = t.submission_id
+    """)
+    op.execute(f"""
+        INSERT INTO tests_score_histogram (test_id, bucket, submissions)
+        SELECT test_id, CAST(floor(coalesce(score, 0) / {BUCKET_SIZE}) AS integer), count(*)
+        FROM candidates_submissions
+        WHERE submitted IS TRUE AND test_id IS NOT NULL
+        GROUP BY 1, 2
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_candidates_submissions_ranking', table_name='candidates_submissions')
+    op.drop_table('tests_score_histogram')
+    op.drop_column('candidates_submissions', 'pending_count')
+    op.drop_column('candidates_submissions', 'graded_count')
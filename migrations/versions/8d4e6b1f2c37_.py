@@ -0,0 +1,24 @@
+"""users version
+
+Revision ID: 8d4e6b1f2c37
+Revises: 3f1c2a7d9e10
+Create Date: 2026-10-19 11:03:45.120934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4e6b1f2c37'
+down_revision = '3f1c2a7d9e10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('version', sa.BigInteger(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('users', 'version')
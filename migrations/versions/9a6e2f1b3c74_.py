@@ -0,0 +1,30 @@
+"""manual grading leases
+
+Revision ID: 9a6e2f1b3c74
+Revises: 4b8f0c2d6a91
+Create Date: 2026-10-19 17:05:33.201457
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a6e2f1b3c74'
+down_revision = '4b8f0c2d6a91'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('candidates_answers', sa.Column('claimed_by', sa.BigInteger(), nullable=True))
+    op.add_column('candidates_answers', sa.Column('claimed_until', sa.DateTime(), nullable=True))
+    # the grading queue scans only ungraded answers
+    op.create_index('ix_candidates_answers_ungraded', 'candidates_answers', ['submission_id', 'question_id'],
+                    postgresql_where=sa.text('grade IS NULL'))
+
+
+def downgrade():
+    op.drop_index('ix_candidates_answers_ungraded', table_name='candidates_answers')
+    op.drop_column('candidates_answers', 'claimed_until')
+    op.drop_column('candidates_answers', 'claimed_by')
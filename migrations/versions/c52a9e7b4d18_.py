@@ -0,0 +1,35 @@
+"""submission deadline
+
+Revision ID: c52a9e7b4d18
+Revises: 8d4e6b1f2c37
+Create Date: 2026-10-19 13:40:12.663201
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52a9e7b4d18'
+down_revision = '8d4e6b1f2c37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column('candidates_submissions', 'time_start', type_=sa.DateTime(), existing_type=sa.Date())
+    op.alter_column('candidates_submissions', 'time_end', type_=sa.DateTime(), existing_type=sa.Date())
+    op.add_column('candidates_submissions', sa.Column('deadline', sa.DateTime(), nullable=True))
+    # only running submissions are looked up by the sweeper
+    op.create_index('ix_candidates_submissions_running_deadline', 'candidates_submissions', ['deadline'],
+                    postgresql_where=sa.text('submitted IS NOT TRUE AND deadline IS NOT NULL'))
+    # the model keeps minutes since long ago, a date can not be converted to them: existing values are discarded
+    op.alter_column('tests', 'max_time', type_=sa.Integer(), existing_type=sa.Date(), postgresql_using='NULL')
+
+
+def downgrade():
+    op.alter_column('tests', 'max_time', type_=sa.Date(), existing_type=sa.Integer(), postgresql_using='NULL')
+    op.drop_index('ix_candidates_submissions_running_deadline', table_name='candidates_submissions')
+    op.drop_column('candidates_submissions', 'deadline')
+    op.alter_column('candidates_submissions', 'time_end', type_=sa.Date(), existing_type=sa.DateTime())
+    op.alter_column('candidates_submissions', 'time_start', type_=sa.Date(), existing_type=sa.DateTime())
@@ -0,0 +1,28 @@
+"""submission score
+
+Revision ID: e7d3a91c5f02
+Revises: c52a9e7b4d18
+Create Date: 2026-10-19 15:02:47.118640
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7d3a91c5f02'
+down_revision = 'c52a9e7b4d18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('candidates_submissions', sa.Column('score', sa.Numeric(), server_default='0', nullable=True))
+    op.execute("""
+        UPDATE candidates_submissions s
+        SET score = coalesce((SELECT sum(grade) FROM candidates_answers a WHERE a.submission_id = s.id), 0)
+    """)
+
+
+def downgrade():
+    op.drop_column('candidates_submissions', 'score')
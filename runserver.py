@@ -1,3 +1,4 @@
-from server import application
+from server import application, warm_up
 
+warm_up()
 application.run(debug=True)
@@ -1,8 +1,6 @@
 from flask import Flask
 
-from backend.config.main import SPEC_FILENAME
 from backend.core.backend_app import FormsBackend
-from backend.helpers import write_public_file
 
 try:
     from backend.config.main_local import LocalConfig as Config
@@ -13,28 +11,72 @@ flask_app = Flask(__name__, static_url_path=Config.STATIC_URL_PATH, static_folde
 application = FormsBackend(flask_app)
 
 
-def init_app():
-    application.init()
+def init_app(with_spec: bool = False):
+    application.init(with_spec=with_spec)
 
 
 def extend_app():
     from backend.core.extensions import application_extend
-    from backend.core.spec import application_add_spec
+    from backend.core.compression import application_add_compression
+    from backend.core.metrics import application_add_metrics
+    from backend.core.profiling import application_add_profiling
+    from backend.core.serialization import application_add_json
+    from backend.core.spec import application_add_spec, application_add_spec_generation
 
+    application_add_metrics(application)
+    application_add_profiling(application)
+    application_add_json(application)
+    application_add_compression(application)
     application_extend(application)
     application_add_spec(application)
+    application_add_spec_generation(application)
+
+
+def create_app(with_spec: bool = False) -> Flask:
+    """
+    Application factory. Builds routes and hooks once; OpenAPI spec is generated only when `with_spec` is set,
+    otherwise on the first request to the spec file or by `flask spec` command
+    """
+    if not application.initialized:
+        init_app(with_spec=with_spec)
+        extend_app()
+    elif with_spec:
+        application.build_spec()
+
+    return flask_app
+
+
+def warm_up():
+    """
+    Fills process caches, requires database connection
+    """
+    application.tests_cache.warm()
+
+
+def preload():
+    """
+    Warms everything in the master process of a preforking server, see `gunicorn.conf.py`
+    """
+    from backend.core.preload import preload as preload_application
+
+    create_app(with_spec=True)
+    preload_application(application)
+
+
+def after_fork():
+    from backend.core.preload import after_fork as after_fork_application
+
+    after_fork_application(application)
 
 
 def write_spec():
-    from backend.core.spec import generate_spec
+    from backend.core.spec import write_spec as write_spec_file
 
-    write_public_file(SPEC_FILENAME, generate_spec(application))
+    write_spec_file(application)
 
 
 def get_application():
     return application
 
 
-init_app()
-extend_app()
-write_spec()
+create_app()
@@ -0,0 +1,22 @@
+"""
+Production entry point.
+
+    python wsgi.py
+
+starts gunicorn with `gunicorn.conf.py`; the same settings are used by
+`gunicorn -c gunicorn.conf.py wsgi:application`.
+"""
+import os
+import sys
+
+if __name__ != '__main__':
+    from server import create_app
+
+    application = create_app()
+else:
+    # the app is built by gunicorn (in the master only in preload mode), not in this process before it
+    from gunicorn.app.wsgiapp import run
+
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')
+    sys.argv = [sys.argv[0], '-c', config_path, *sys.argv[1:], 'wsgi:application']
+    run()